@@ -0,0 +1,54 @@
+"""Carry translations over from a previous English/Sinhala pair to a revised English file"""
+from difflib import SequenceMatcher
+
+from translation_memory import normalize_text
+
+
+def pair_previous(old_source, old_translated):
+    """Pair each old English cue with the Sinhala cue made from it.
+
+    Outputs of this tool have one cue per input cue, so equal-length files
+    are paired by position; otherwise cues are paired by identical timing.
+    """
+    if len(old_source) == len(old_translated):
+        return list(zip(old_source, old_translated))
+    by_timing = {(cue.start, cue.end): cue for cue in old_translated if cue.start is not None}
+    return [
+        (cue, by_timing[(cue.start, cue.end)])
+        for cue in old_source if cue.start is not None and (cue.start, cue.end) in by_timing
+    ]
+
+
+def align_translations(previous_pairs, new_cues):
+    """Map positions in new_cues to the old translation of the same line.
+
+    Runs of unchanged lines are matched in order first, so cues that were
+    only re-timed, renumbered or pushed along by an added scene keep the
+    translation they had in context. Any other new cue whose text appears
+    in the old file takes the translation of the occurrence closest in
+    time. Edited and new lines are left out. Returns {position: translation}.
+    """
+    old_keys = [normalize_text(source.text) for source, _ in previous_pairs]
+    new_keys = [normalize_text(cue.text) for cue in new_cues]
+
+    aligned = {}
+    matcher = SequenceMatcher(None, old_keys, new_keys, autojunk=False)
+    for block in matcher.get_matching_blocks():
+        for offset in range(block.size):
+            aligned[block.b + offset] = previous_pairs[block.a + offset][1].text
+
+    occurrences = {}
+    for key, (source, translated) in zip(old_keys, previous_pairs):
+        occurrences.setdefault(key, []).append((source.start, translated.text))
+    for position, key in enumerate(new_keys):
+        if position in aligned or key not in occurrences:
+            continue
+        start = new_cues[position].start
+        if start is None:  # No timing to go by: the first occurrence
+            aligned[position] = occurrences[key][0][1]
+            continue
+        aligned[position] = min(
+            occurrences[key],
+            key=lambda occurrence: abs(occurrence[0] - start) if occurrence[0] is not None else float('inf')
+        )[1]
+    return aligned
@@ -1,13 +1,34 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
-import google.generativeai as genai
-import re
+import tkinter.font as tkFont
 import os
 import threading
-import time
+import queue
 import json
 from pathlib import Path
 import random
+from planner import format_plan, plan_translation
+from translator import TranslationEngine, TranslationJob
+
+# Preferred Sinhala-capable fonts, best first
+SINHALA_FONTS = [
+    "Noto Sans Sinhala",
+    "Iskoola Pota",
+    "DL-Manel",
+    "Malithi Web",
+    "Potha",
+    "Arial Unicode MS",
+    "Segoe UI"
+]
+_sinhala_font = None
+
+def find_sinhala_font(root):
+    """Pick the first installed Sinhala font with one families() lookup (cached)"""
+    global _sinhala_font
+    if _sinhala_font is None:
+        installed = set(tkFont.families(root))
+        _sinhala_font = next((name for name in SINHALA_FONTS if name in installed), "Arial")
+    return _sinhala_font
 
 class MultiAPISubtitleTranslator:
     def __init__(self, root):
@@ -16,6 +37,15 @@ class MultiAPISubtitleTranslator:
         self.root.geometry("950x800")
         self.root.configure(bg='#2c3e50')
         
+        # Worker threads never touch Tk directly: logs and calls are queued,
+        # progress/status updates are coalesced, and the main loop applies
+        # them every ui_refresh_ms
+        self.ui_queue = queue.Queue()
+        self.ui_lock = threading.Lock()
+        self.pending_ui = {}
+        self.ui_refresh_ms = 200
+        self.max_log_lines = 2000
+        
         # Configure fonts for Sinhala Unicode support
         self.setup_fonts()
         
@@ -27,82 +57,36 @@ class MultiAPISubtitleTranslator:
             "key4"
         ]
         
-        self.current_api_index = 0
-        self.models = {}
-        self.setup_models()
+        # Translation engine: backend, key budgets, memory and settings
+        self.engine = TranslationEngine(self.api_keys, log=self.log_message)
+        self.engine.setup_models()
         
         self.input_file = None
         self.output_file = None
-        self.subtitles = []
-        
-        # Optimized settings
-        self.batch_size = 15  # Larger batch size for faster processing
-        self.max_retries = 3
-        self.retry_delay = 1  # Shorter delay for retries
-        
-        self.translation_active = False
-        self.completed_batches = 0
+        self.previous_files = None  # (English, Sinhala) of an earlier version, for re-translation
+        self.job = None  # TranslationJob of the current run
         
         self.title_colors = ["#FFFF00", "#FFEE00", "#FFD700", "#FFC300", "#FFAA00"] # Yellow, LighterYellow, Gold, GoldenYellow, OrangeYellow
         self.current_title_color_index = 0
         
         self.setup_ui()
+        self.snapshot_settings()
         self.animate_title_color() # Start the glitter effect
+        self.process_ui_queue()
     
     def setup_fonts(self):
         """Setup fonts for Sinhala Unicode support"""
         try:
-            # Try different Sinhala fonts
-            sinhala_fonts = [
-                "Noto Sans Sinhala",
-                "Iskoola Pota", 
-                "DL-Manel",
-                "Malithi Web",
-                "Potha",
-                "Arial Unicode MS",
-                "Segoe UI"
-            ]
-            
-            # Test which font works
-            import tkinter.font as tkFont
-            for font_name in sinhala_fonts:
-                try:
-                    test_font = tkFont.Font(family=font_name, size=10)
-                    self.sinhala_font = font_name
-                    self.log_message(f"✅ Using Sinhala font: {font_name}")
-                    break
-                except:
-                    continue
-            else:
-                self.sinhala_font = "Arial"
+            self.sinhala_font = find_sinhala_font(self.root)
+            if self.sinhala_font == "Arial":
                 self.log_message("⚠️ No Sinhala font found, using Arial")
+            else:
+                self.log_message(f"✅ Using Sinhala font: {self.sinhala_font}")
                 
         except Exception as e:
             self.sinhala_font = "Arial"
             self.log_message(f"⚠️ Font setup error: {str(e)}")
     
-    def setup_models(self):
-        """Initialize models for all API keys"""
-        for i, api_key in enumerate(self.api_keys):
-            try:
-                genai.configure(api_key=api_key)
-                self.models[i] = genai.GenerativeModel('gemini-2.0-flash-exp')
-                self.log_message(f"✅ API Key {i+1} initialized successfully")
-            except Exception as e:
-                self.log_message(f"❌ Failed to initialize API Key {i+1}: {str(e)}")
-    
-    def get_next_model(self):
-        """Get next available model with API key rotation"""
-        self.current_api_index = (self.current_api_index + 1) % len(self.api_keys)
-        
-        # Configure the API key for this request
-        try:
-            genai.configure(api_key=self.api_keys[self.current_api_index])
-            return self.models[self.current_api_index]
-        except Exception as e:
-            self.log_message(f"⚠️ Error switching to API key {self.current_api_index + 1}: {str(e)}")
-            return self.models[0]  # Fallback to first model
-    
     def setup_ui(self):
         # Title
         title_label = tk.Label(
@@ -178,6 +162,125 @@ class MultiAPISubtitleTranslator:
             selectcolor='#34495e'
         ).grid(row=0, column=2, padx=20)
         
+        # Concurrent requests (batches in flight at once)
+        tk.Label(
+            settings_grid,
+            text="Concurrent Requests:",
+            font=("Arial", 10),
+            bg='#2c3e50',
+            fg='#ecf0f1'
+        ).grid(row=1, column=0, sticky='w', padx=5, pady=(5, 0))
+        
+        self.concurrency_var = tk.IntVar(value=self.engine.max_in_flight)
+        tk.Spinbox(
+            settings_grid,
+            from_=1,
+            to=16,
+            width=8,
+            textvariable=self.concurrency_var,
+            font=("Arial", 10)
+        ).grid(row=1, column=1, padx=5, pady=(5, 0))
+        
+        # Per-key request budget
+        tk.Label(
+            settings_grid,
+            text="Requests/min per Key:",
+            font=("Arial", 10),
+            bg='#2c3e50',
+            fg='#ecf0f1'
+        ).grid(row=1, column=2, sticky='w', padx=20, pady=(5, 0))
+        
+        self.rpm_var = tk.IntVar(value=self.engine.requests_per_minute)
+        tk.Spinbox(
+            settings_grid,
+            from_=1,
+            to=1000,
+            width=8,
+            textvariable=self.rpm_var,
+            font=("Arial", 10)
+        ).grid(row=1, column=3, padx=5, pady=(5, 0))
+        
+        # Translation memory (reuse earlier translations of identical lines)
+        self.use_memory_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(
+            settings_grid,
+            text="Use Translation Memory",
+            variable=self.use_memory_var,
+            font=("Arial", 10),
+            bg='#2c3e50',
+            fg='#ecf0f1',
+            selectcolor='#34495e'
+        ).grid(row=0, column=3, columnspan=2, padx=5, sticky='w')
+        
+        # Adaptive batch size (pack by characters, tuned during the run)
+        self.adaptive_batch_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(
+            settings_grid,
+            text="Adaptive Batch Size",
+            variable=self.adaptive_batch_var,
+            font=("Arial", 10),
+            bg='#2c3e50',
+            fg='#ecf0f1',
+            selectcolor='#34495e'
+        ).grid(row=2, column=0, columnspan=2, padx=5, pady=(5, 0), sticky='w')
+        
+        # Structured JSON replies (falls back to [n] markers if the JSON is bad)
+        self.json_mode_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(
+            settings_grid,
+            text="Structured JSON Responses",
+            variable=self.json_mode_var,
+            font=("Arial", 10),
+            bg='#2c3e50',
+            fg='#ecf0f1',
+            selectcolor='#34495e'
+        ).grid(row=2, column=2, columnspan=2, padx=20, pady=(5, 0), sticky='w')
+        
+        # Metrics export (JSON + Prometheus text next to the output file)
+        self.export_metrics_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(
+            settings_grid,
+            text="Export Metrics",
+            variable=self.export_metrics_var,
+            font=("Arial", 10),
+            bg='#2c3e50',
+            fg='#ecf0f1',
+            selectcolor='#34495e'
+        ).grid(row=3, column=0, columnspan=2, padx=5, pady=(5, 0), sticky='w')
+        
+        self.profile_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            settings_grid,
+            text="Profile Run (cProfile)",
+            variable=self.profile_var,
+            font=("Arial", 10),
+            bg='#2c3e50',
+            fg='#ecf0f1',
+            selectcolor='#34495e'
+        ).grid(row=3, column=2, columnspan=2, padx=20, pady=(5, 0), sticky='w')
+        
+        self.hedge_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            settings_grid,
+            text="Hedge Slow Requests",
+            variable=self.hedge_var,
+            font=("Arial", 10),
+            bg='#2c3e50',
+            fg='#ecf0f1',
+            selectcolor='#34495e'
+        ).grid(row=4, column=0, columnspan=2, padx=5, pady=(5, 0), sticky='w')
+        
+        self.stream_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            settings_grid,
+            text="Stream Responses",
+            variable=self.stream_var,
+            font=("Arial", 10),
+            bg='#2c3e50',
+            fg='#ecf0f1',
+            selectcolor='#34495e'
+        ).grid(row=4, column=2, columnspan=2, padx=20, pady=(5, 0), sticky='w')
+        
         # File selection frame
         file_frame = tk.Frame(self.root, bg='#2c3e50')
         file_frame.pack(pady=10, padx=20, fill='x')
@@ -260,6 +363,57 @@ class MultiAPISubtitleTranslator:
             cursor='hand2'
         ).pack(side='right')
         
+        # Previous version (optional): reuse its translations for unchanged lines
+        previous_frame = tk.Frame(file_frame, bg='#2c3e50')
+        previous_frame.pack(fill='x', pady=5)
+        
+        tk.Label(
+            previous_frame, 
+            text="Previous Version (optional):", 
+            font=("Arial", 11, "bold"),
+            bg='#2c3e50',
+            fg='#ecf0f1'
+        ).pack(anchor='w')
+        
+        previous_file_frame = tk.Frame(previous_frame, bg='#2c3e50')
+        previous_file_frame.pack(fill='x', pady=5)
+        
+        self.previous_file_label = tk.Label(
+            previous_file_frame,
+            text="None - translate every line",
+            font=("Arial", 10),
+            bg='#34495e',
+            fg='#bdc3c7',
+            relief='sunken',
+            padx=10,
+            pady=5
+        )
+        self.previous_file_label.pack(side='left', fill='x', expand=True, padx=(0, 10))
+        
+        tk.Button(
+            previous_file_frame,
+            text="✖",
+            command=self.clear_previous_files,
+            bg='#7f8c8d',
+            fg='white',
+            font=("Arial", 10, "bold"),
+            padx=10,
+            relief='flat',
+            cursor='hand2'
+        ).pack(side='right')
+        
+        tk.Button(
+            previous_file_frame,
+            text="📁 Browse",
+            command=self.select_previous_files,
+            bg='#3498db',
+            fg='white',
+            font=("Arial", 10, "bold"),
+            padx=20,
+            relief='flat',
+            cursor='hand2'
+        ).pack(side='right', padx=(0, 10))
+        
         # Progress frame
         progress_frame = tk.Frame(self.root, bg='#2c3e50')
         progress_frame.pack(pady=20, padx=20, fill='x')
@@ -314,6 +468,20 @@ class MultiAPISubtitleTranslator:
         )
         self.translate_btn.pack(side='left', padx=10)
         
+        self.plan_btn = tk.Button(
+            button_frame,
+            text="📋 Plan",
+            command=self.plan_run,
+            bg='#8e44ad',
+            fg='white',
+            font=("Arial", 14, "bold"),
+            padx=20,
+            pady=12,
+            relief='flat',
+            cursor='hand2'
+        )
+        self.plan_btn.pack(side='left', padx=10)
+        
         self.stop_btn = tk.Button(
             button_frame,
             text="⏹️ Stop",
@@ -363,11 +531,62 @@ class MultiAPISubtitleTranslator:
             self.root.after(500, self.animate_title_color) # Change color every 500ms
     
     def log_message(self, message):
-        """Add message to log area"""
-        if hasattr(self, 'log_text'):
-            self.log_text.insert(tk.END, f"{message}\n")
-            self.log_text.see(tk.END)
-            self.root.update_idletasks()
+        """Add message to log area (safe to call from any thread)"""
+        self.ui_queue.put(('log', message))
+    
+    def update_ui(self, **state):
+        """Queue status/speed/api_status text or progress for the next repaint.
+        
+        Only the latest value of each field is kept, so a burst of updates
+        from the workers costs a single redraw.
+        """
+        with self.ui_lock:
+            self.pending_ui.update(state)
+    
+    def run_on_ui(self, func, *args):
+        """Run func(*args) on the Tk main loop"""
+        self.ui_queue.put(('call', (func, args)))
+    
+    def process_ui_queue(self):
+        """Apply queued worker messages to the widgets, then reschedule"""
+        lines = []
+        while True:
+            try:
+                kind, payload = self.ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'log':
+                lines.append(payload)
+            else:
+                # Show earlier log lines before a call (e.g. a dialog) blocks
+                self.append_log_lines(lines)
+                lines = []
+                func, args = payload
+                func(*args)
+        self.append_log_lines(lines)
+        
+        with self.ui_lock:
+            state, self.pending_ui = self.pending_ui, {}
+        if 'progress' in state:
+            self.progress_var.set(state['progress'])
+        if 'status' in state:
+            self.status_label.config(text=state['status'])
+        if 'speed' in state:
+            self.speed_label.config(text=state['speed'])
+        if 'api_status' in state:
+            self.api_status_label.config(text=state['api_status'])
+        
+        self.root.after(self.ui_refresh_ms, self.process_ui_queue)
+    
+    def append_log_lines(self, lines):
+        """Append lines to the log view, keeping only the last max_log_lines"""
+        if not lines:
+            return
+        self.log_text.insert(tk.END, "\n".join(lines) + "\n")
+        line_count = int(self.log_text.index('end-1c').split('.')[0])
+        if line_count > self.max_log_lines:
+            self.log_text.delete('1.0', f"{line_count - self.max_log_lines + 1}.0")
+        self.log_text.see(tk.END)
     
     def select_input_file(self):
         """Select input SRT file"""
@@ -397,134 +616,28 @@ class MultiAPISubtitleTranslator:
             self.output_file = file_path
             self.output_file_label.config(text=os.path.basename(file_path))
     
-    def parse_srt_file(self, file_path):
-        """Parse SRT subtitle file"""
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-        
-        blocks = re.split(r'\n\s*\n', content.strip())
-        subtitles = []
-        
-        for block in blocks:
-            lines = block.strip().split('\n')
-            if len(lines) >= 3:
-                try:
-                    index = int(lines[0])
-                    timestamp = lines[1]
-                    text = '\n'.join(lines[2:])
-                    subtitles.append({
-                        'index': index,
-                        'timestamp': timestamp,
-                        'text': text
-                    })
-                except ValueError:
-                    continue
-        
-        return subtitles
-    
-    def create_batches(self, subtitles, batch_size):
-        """Create batches of subtitles for processing"""
-        batches = []
-        for i in range(0, len(subtitles), batch_size):
-            batches.append(subtitles[i:i + batch_size])
-        return batches
-    
-    def translate_batch_with_retry(self, batch, batch_num, total_batches):
-        """Translate a batch of subtitles with retry mechanism"""
-        for attempt in range(self.max_retries):
-            try:
-                # Get next model (rotates API keys)
-                if self.auto_rotate_var.get():
-                    model = self.get_next_model()
-                    self.api_status_label.config(text=f"🔑 Using API Key {self.current_api_index + 1}")
-                else:
-                    model = self.models[0]
-                
-                # Create batch prompt
-                batch_text = ""
-                for i, subtitle in enumerate(batch):
-                    batch_text += f"[{i+1}] {subtitle['text']}\n\n"
-                
-                prompt = f"""Translate these English subtitles to Sinhala. Keep each translation natural and conversational, suitable for movie subtitles.
-                Return them in the exact same format with [1], [2], etc. markers.
-                
-                {batch_text}
-                
-                Provide only the Sinhala translations with the same numbering, no explanations."""
-                
-                self.log_message(f"🔄 Processing batch {batch_num}/{total_batches} with API key {self.current_api_index + 1}")
-                
-                response = model.generate_content(prompt)
-                translated_texts_raw = self.parse_batch_response(response.text, len(batch))
-                
-                # Make translated text bold
-                translated_texts_bold = [f"<b>{text}</b>" if text != "Translation failed" else text for text in translated_texts_raw]
-                
-                # Create translated batch
-                translated_batch = []
-                for i, subtitle in enumerate(batch):
-                    translated_batch.append({
-                        'index': subtitle['index'],
-                        'timestamp': subtitle['timestamp'],
-                        'text': translated_texts_bold[i] if i < len(translated_texts_bold) else f"<b>{subtitle['text']}</b>" # Bold original if translation failed
-                    })
-                
-                self.log_message(f"✅ Batch {batch_num} completed successfully")
-                return translated_batch
-                
-            except Exception as e:
-                error_msg = str(e).lower()
-                if "rate limit" in error_msg or "quota" in error_msg:
-                    self.log_message(f"⚠️ Rate limit hit on attempt {attempt + 1}, trying next API key...")
-                    time.sleep(self.retry_delay)
-                    continue
-                else:
-                    self.log_message(f"⚠️ Error in batch {batch_num}, attempt {attempt + 1}: {str(e)}")
-                    if attempt < self.max_retries - 1:
-                        time.sleep(self.retry_delay * (attempt + 1))
-                    continue
-        
-        # If all retries failed, return original batch
-        self.log_message(f"❌ Failed to translate batch {batch_num} after {self.max_retries} attempts")
-        return batch
-    
-    def parse_batch_response(self, response_text, expected_count):
-        """Parse batch translation response"""
-        lines = response_text.strip().split('\n')
-        translations = []
-        current_translation = ""
-        
-        for line in lines:
-            line = line.strip()
-            if re.match(r'^\[\d+\]', line):
-                if current_translation:
-                    translations.append(current_translation.strip())
-                current_translation = re.sub(r'^\[\d+\]\s*', '', line)
-            else:
-                if current_translation:
-                    current_translation += "\n" + line
-        
-        if current_translation:
-            translations.append(current_translation.strip())
-        
-        # Ensure we have the expected number of translations
-        while len(translations) < expected_count:
-            translations.append("Translation failed")
-        
-        return translations[:expected_count]
+    def select_previous_files(self):
+        """Select the previous English file and its Sinhala translation"""
+        source_path = filedialog.askopenfilename(
+            title="Select Previous English Subtitle File",
+            filetypes=[("SRT files", "*.srt"), ("All files", "*.*")]
+        )
+        if not source_path:
+            return
+        translation_path = filedialog.askopenfilename(
+            title="Select Its Sinhala Translation",
+            filetypes=[("SRT files", "*.srt"), ("All files", "*.*")]
+        )
+        if translation_path:
+            self.previous_files = (source_path, translation_path)
+            self.previous_file_label.config(
+                text=f"{os.path.basename(source_path)} + {os.path.basename(translation_path)}"
+            )
     
-    def save_srt_file(self, subtitles, file_path):
-        """Save translated subtitles to SRT file with proper UTF-8 encoding"""
-        try:
-            with open(file_path, 'w', encoding='utf-8-sig') as file:  # UTF-8 with BOM
-                for subtitle in subtitles:
-                    file.write(f"{subtitle['index']}\n")
-                    file.write(f"{subtitle['timestamp']}\n")
-                    file.write(f"{subtitle['text']}\n\n")
-            self.log_message(f"💾 File saved with UTF-8 encoding: {os.path.basename(file_path)}")
-        except Exception as e:
-            self.log_message(f"❌ Error saving file: {str(e)}")
-            raise
+    def clear_previous_files(self):
+        """Translate every line again"""
+        self.previous_files = None
+        self.previous_file_label.config(text="None - translate every line")
     
     def start_translation(self):
         """Start the translation process"""
@@ -536,116 +649,103 @@ class MultiAPISubtitleTranslator:
             messagebox.showerror("Error", "Please specify an output file")
             return
         
-        self.translation_active = True
+        if not self.engine.ready_keys:
+            messagebox.showerror("Error", "No API key could be initialized - check the log")
+            return
+        
         self.translate_btn.config(state='disabled')
+        # Planning snapshots the settings into the engine, so not during a run
+        self.plan_btn.config(state='disabled')
         self.stop_btn.config(state='normal')
-        self.completed_batches = 0
         
-        # Update batch size from UI
-        self.batch_size = self.batch_size_var.get()
+        self.snapshot_settings()
+        
+        self.job = TranslationJob(
+            self.engine, self.input_file, self.output_file,
+            on_progress=self.update_ui, previous=self.previous_files
+        )
         
         # Start translation in separate thread
-        thread = threading.Thread(target=self.translate_subtitles)
+        thread = threading.Thread(target=self.translate_subtitles, args=(self.job,))
         thread.daemon = True
         thread.start()
     
+    def snapshot_settings(self):
+        """Copy the settings out of the Tk variables; worker threads only read these copies"""
+        self.engine.auto_rotate = self.auto_rotate_var.get()
+        self.engine.use_memory = self.use_memory_var.get()
+        self.engine.adaptive_batching = self.adaptive_batch_var.get()
+        self.engine.json_mode = self.json_mode_var.get()
+        self.engine.export_metrics_enabled = self.export_metrics_var.get()
+        self.engine.profile_run = self.profile_var.get()
+        self.engine.hedge_requests = self.hedge_var.get()
+        self.engine.streaming = self.stream_var.get()
+        
+        # Update batch size, concurrency and key budgets from UI
+        self.engine.batch_size = self.batch_size_var.get()
+        self.engine.max_in_flight = max(1, self.concurrency_var.get())
+        self.engine.set_rate_limits(self.rpm_var.get())
+    
+    def plan_run(self):
+        """Log what a run of the selected file would send and how long it would take, without calling the API"""
+        if not self.input_file:
+            messagebox.showerror("Error", "Please select an input file")
+            return
+        
+        self.snapshot_settings()
+        file_pairs = [(self.input_file, self.output_file)]
+        
+        def plan():
+            try:
+                for line in format_plan(plan_translation(self.engine, file_pairs)):
+                    self.log_message(line)
+            except Exception as e:
+                self.log_message(f"❌ Could not plan the run: {str(e)}")
+        
+        threading.Thread(target=plan, daemon=True).start()
+    
     def stop_translation(self):
         """Stop the translation process"""
-        self.translation_active = False
-        self.translate_btn.config(state='normal')
+        if self.job is not None:
+            self.job.stop()
+        # Start is re-enabled by translate_subtitles once the job has let go
+        # of its output and journal (in-flight requests may still land)
         self.stop_btn.config(state='disabled')
-        self.status_label.config(text="Translation stopped")
+        self.status_label.config(text="Stopping...")
         self.speed_label.config(text="")
         self.log_message("🛑 Translation stopped by user")
     
-    def translate_subtitles(self):
-        """Main translation function with batch processing"""
+    def translate_subtitles(self, job):
+        """Run a translation job on a worker thread and report the outcome"""
         try:
-            start_time = time.time()
-            
-            self.log_message("🔍 Parsing subtitle file...")
-            self.status_label.config(text="Parsing subtitle file...")
-            
-            # Parse input file
-            subtitles = self.parse_srt_file(self.input_file)
-            total_subtitles = len(subtitles)
-            
-            if total_subtitles == 0:
-                self.log_message("❌ No subtitles found in file")
-                self.stop_translation()
-                return
-            
-            # Create batches
-            batches = self.create_batches(subtitles, self.batch_size)
-            total_batches = len(batches)
-            
-            self.log_message(f"📝 Found {total_subtitles} subtitle entries")
-            self.log_message(f"📦 Created {total_batches} batches (batch size: {self.batch_size})")
-            self.log_message(f"🔑 Using {len(self.api_keys)} API keys for rotation")
-            
-            # Process batches
-            translated_subtitles = []
+            summary = job.run()
             
-            for batch_num, batch in enumerate(batches, 1):
-                if not self.translation_active:
-                    break
-                
-                self.status_label.config(text=f"Processing batch {batch_num}/{total_batches}")
-                
-                # Translate batch
-                translated_batch = self.translate_batch_with_retry(batch, batch_num, total_batches)
-                translated_subtitles.extend(translated_batch)
-                
-                self.completed_batches += 1
-                
-                # Update progress
-                progress = (self.completed_batches / total_batches) * 100
-                self.progress_var.set(progress)
-                
-                # Calculate and display speed
-                elapsed_time = time.time() - start_time
-                if elapsed_time > 0:
-                    subtitles_per_sec = (self.completed_batches * self.batch_size) / elapsed_time
-                    self.speed_label.config(text=f"⚡ {subtitles_per_sec:.1f} subtitles/sec")
-                
-                # Small delay to prevent overwhelming the APIs
-                if batch_num < total_batches:
-                    time.sleep(0.2)
-            
-            if self.translation_active:
-                # Save translated file
-                self.log_message("💾 Saving translated subtitles...")
-                self.status_label.config(text="Saving file...")
-                
-                self.save_srt_file(translated_subtitles, self.output_file)
-                
-                total_time = time.time() - start_time
-                avg_speed = total_subtitles / total_time if total_time > 0 else 0
-                
-                self.log_message(f"🎉 Translation completed successfully!")
-                self.log_message(f"📊 Processed {total_subtitles} subtitles in {total_time:.1f} seconds")
-                self.log_message(f"⚡ Average speed: {avg_speed:.1f} subtitles/second")
-                self.log_message(f"💾 Saved to: {self.output_file}")
+            if summary['status'] == 'empty':
+                # The job has logged it; the buttons are reset below
+                self.run_on_ui(self.status_label.config, {'text': "No subtitles found"})
+                self.run_on_ui(self.speed_label.config, {'text': ""})
+            elif summary['status'] == 'stopped':
+                self.run_on_ui(self.status_label.config, {'text': "Translation stopped"})
+            elif summary['status'] == 'completed':
                 self.log_message("සිංහල උපසිරැසි සාර්ථකව නිර්මාණය කරන ලදී!")
-                
-                self.status_label.config(text="Translation completed successfully!")
-                self.speed_label.config(text=f"⚡ Final: {avg_speed:.1f} subtitles/sec")
-                
-                messagebox.showinfo(
+                self.run_on_ui(
+                    messagebox.showinfo,
                     "Success!", 
-                    f"Translation completed in {total_time:.1f} seconds!\n"
-                    f"Speed: {avg_speed:.1f} subtitles/second\n"
-                    f"Saved to: {os.path.basename(self.output_file)}"
+                    f"Translation completed in {summary['seconds']:.1f} seconds!\n"
+                    f"Speed: {summary['cues_per_second']:.1f} subtitles/second\n"
+                    f"Translation memory hits: {summary['memory_hits']}/{summary['cues']}\n"
+                    f"Saved to: {os.path.basename(job.output_file)}"
                 )
             
         except Exception as e:
             self.log_message(f"❌ Error during translation: {str(e)}")
-            messagebox.showerror("Error", f"Translation failed: {str(e)}")
+            self.run_on_ui(messagebox.showerror, "Error", f"Translation failed: {str(e)}")
         
         finally:
-            self.translate_btn.config(state='normal')
-            self.stop_btn.config(state='disabled')
-            self.translation_active = False
+            self.run_on_ui(self.translate_btn.config, {'state': 'normal'})
+            self.run_on_ui(self.plan_btn.config, {'state': 'normal'})
+            self.run_on_ui(self.stop_btn.config, {'state': 'disabled'})
+            self.engine.evict_memory()
 
 def main():
     root = tk.Tk()
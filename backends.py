@@ -0,0 +1,544 @@
+"""Translation backends: a batch of English texts in, Sinhala translations out"""
+import json
+import random
+import re
+import threading
+import time
+from collections import namedtuple
+from contextlib import nullcontext
+
+from rate_limiter import estimate_tokens
+
+MODEL_NAME = 'gemini-2.0-flash-exp'
+
+# Response schema for structured (JSON) translation replies
+TRANSLATION_SCHEMA = {
+    'type': 'ARRAY',
+    'items': {
+        'type': 'OBJECT',
+        'properties': {
+            'id': {'type': 'INTEGER'},
+            'text': {'type': 'STRING'}
+        },
+        'required': ['id', 'text']
+    }
+}
+
+# translations has one entry per input text (None where the reply had none);
+# total_tokens and prompt_tokens are the real usage if the backend reports
+# it; stream_error is the error that cut a streamed reply short after some
+# items had arrived
+BatchResult = namedtuple(
+    'BatchResult', ['translations', 'total_tokens', 'parse_fallback', 'stream_error', 'prompt_tokens'],
+    defaults=(None, None)
+)
+
+
+class QuotaExceededError(Exception):
+    """A key was rate limited or ran out of quota (HTTP 429).
+
+    retry_after is the server's hint in seconds, if it gave one; daily is
+    True when the key's quota for the day is used up.
+    """
+
+    def __init__(self, message, retry_after=None, daily=False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.daily = daily
+
+
+def quota_error_from(error):
+    """Build a QuotaExceededError from a 429 APIError, reading its RetryInfo and QuotaFailure details"""
+    retry_after = None
+    daily = False
+    details = getattr(error, 'details', None)
+    body = details.get('error', details) if isinstance(details, dict) else {}
+    for detail in body.get('details', []) if isinstance(body, dict) else []:
+        if not isinstance(detail, dict):
+            continue
+        kind = detail.get('@type', '')
+        if kind.endswith('RetryInfo'):
+            delay = str(detail.get('retryDelay', ''))
+            try:
+                retry_after = float(delay.rstrip('s'))
+            except ValueError:
+                pass
+        elif kind.endswith('QuotaFailure'):
+            daily = any('PerDay' in str(violation.get('quotaId', '')) for violation in detail.get('violations', []))
+    return QuotaExceededError(str(error), retry_after=retry_after, daily=daily)
+
+
+# Fixed instructions go into the model's system instruction once; each
+# request then only carries the subtitles themselves
+SYSTEM_INSTRUCTION = (
+    "Translate English movie subtitles to natural, conversational Sinhala. "
+    "Each subtitle is given as [n] followed by its text. "
+)
+JSON_REPLY_INSTRUCTION = 'Reply with a JSON array of {"id": n, "text": translation} objects, one per subtitle.'
+MARKER_REPLY_INSTRUCTION = "Reply with only the translations, each starting with its [n] marker."
+
+
+def system_instruction(json_mode):
+    """Instructions shared by every request of a reply format"""
+    return SYSTEM_INSTRUCTION + (JSON_REPLY_INSTRUCTION if json_mode else MARKER_REPLY_INSTRUCTION)
+
+
+def build_prompt(texts):
+    """Per-request payload: one [n] line per subtitle, nothing else"""
+    return "\n".join(f"[{i}] {text}" for i, text in enumerate(texts, 1))
+
+
+def parse_json_response(response_text, expected_count):
+    """Parse a structured reply: a JSON array of {"id", "text"} objects.
+
+    Single pass over the decoded array; ids outside 1..expected_count and
+    duplicates are ignored, missing ids stay None. Raises ValueError if
+    the reply is not an array of such objects.
+    """
+    items = json.loads(response_text)
+    if not isinstance(items, list):
+        raise ValueError("reply is not a JSON array")
+
+    translations = [None] * expected_count
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError("array item is not an object")
+        item_id = item.get('id')
+        text = item.get('text')
+        if not isinstance(item_id, int) or not isinstance(text, str):
+            raise ValueError("item without an integer id and string text")
+        if 1 <= item_id <= expected_count and translations[item_id - 1] is None:
+            translations[item_id - 1] = text.strip() or None
+    return translations
+
+
+def parse_partial_json_response(response_text, expected_count):
+    """Recover the complete {"id", "text"} objects of a broken JSON reply.
+
+    A reply cut off by the output limit still holds every object before
+    the cut; those are kept and the missing ids stay None, so only they
+    are requested again.
+    """
+    decoder = json.JSONDecoder()
+    translations = [None] * expected_count
+    position = 0
+    while True:
+        start = response_text.find('{', position)
+        if start < 0:
+            return translations
+        try:
+            item, position = decoder.raw_decode(response_text, start)
+        except ValueError:
+            position = start + 1  # Not an object, or the cut-off last one
+            continue
+        if not isinstance(item, dict):
+            continue
+        item_id = item.get('id')
+        text = item.get('text')
+        if isinstance(item_id, int) and isinstance(text, str) and 1 <= item_id <= expected_count:
+            if translations[item_id - 1] is None:
+                translations[item_id - 1] = text.strip() or None
+
+
+def marker_item_text(lines):
+    """Text of one [n] item from the lines after its marker.
+
+    The item ends at the first blank line after its text, so whatever
+    follows (such as an item whose marker came out broken) is not glued
+    onto it; a blank line would also break the SRT cue.
+    """
+    kept = []
+    for line in lines:
+        line = line.strip()
+        if line:
+            kept.append(line)
+        elif kept:
+            break
+    return "\n".join(kept)
+
+
+def parse_batch_response(response_text, expected_count):
+    """Parse a [n]-marker reply.
+
+    Items are placed by their [n] marker, so a skipped marker leaves a
+    None gap instead of shifting every later translation.
+    """
+    blocks = []
+    for line in response_text.strip().split('\n'):
+        match = re.match(r'^\[(\d+)\]\s*', line.strip())
+        if match:
+            blocks.append((int(match.group(1)), [line.strip()[match.end():]]))
+        elif blocks:
+            blocks[-1][1].append(line)
+
+    translations = [None] * expected_count
+    for number, lines in blocks:
+        text = marker_item_text(lines)
+        if text and 1 <= number <= expected_count and translations[number - 1] is None:
+            translations[number - 1] = text
+
+    return translations
+
+
+MARKER_PATTERN = re.compile(r'^[ \t]*\[(\d+)\][ \t]*', re.MULTILINE)
+
+
+class IncrementalReplyParser:
+    """Parses a reply while it streams in and releases each item once it is complete.
+
+    An [n] item is complete when the next marker starts (the last one when
+    the reply ends); a JSON item when its object closes. on_item(index,
+    text) is called at most once per index, from the feeding thread.
+    """
+
+    def __init__(self, expected_count, json_mode, on_item):
+        self.expected_count = expected_count
+        self.json_mode = json_mode
+        self.on_item = on_item
+        self.translations = [None] * expected_count
+        self.buffer = ""
+        self.position = 0  # Start of the unparsed rest of the buffer
+        self.decoder = json.JSONDecoder()
+        self.received = 0
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        if self.json_mode:
+            self._parse_json_items()
+        else:
+            self._parse_marker_items(final=False)
+
+    def finish(self, complete=True):
+        """Parse what is left of the reply; returns (translations, parse_fallback).
+
+        A reply that broke off (complete=False) keeps only the items that
+        were already released, as the last one may be cut short.
+        """
+        if not complete:
+            return self.translations, False
+        if not self.json_mode:
+            self._parse_marker_items(final=True)
+            return self.translations, False
+        # Let the one-shot parser settle the whole reply (and fall back to markers)
+        translations, parse_fallback = parse_response(self.buffer, self.expected_count, True)
+        for index, text in enumerate(translations):
+            if text is not None:
+                self._release(index + 1, text)
+        return self.translations, parse_fallback
+
+    def _release(self, number, text):
+        if text and 1 <= number <= self.expected_count and self.translations[number - 1] is None:
+            self.translations[number - 1] = text
+            self.received += 1
+            self.on_item(number - 1, text)
+
+    def _parse_marker_items(self, final):
+        matches = list(MARKER_PATTERN.finditer(self.buffer, self.position))
+        # Without the end of the reply, the last marker's item may still grow
+        closed = matches if final else matches[:-1]
+        for match, following in zip(closed, matches[1:] + [None]):
+            end = following.start() if following is not None else len(self.buffer)
+            self._release(int(match.group(1)), marker_item_text(self.buffer[match.end():end].split('\n')))
+        if closed and not final:
+            self.position = matches[-1].start()
+
+    def _parse_json_items(self):
+        buffer = self.buffer
+        while True:
+            start = buffer.find('{', self.position)
+            if start < 0:
+                return
+            try:
+                item, end = self.decoder.raw_decode(buffer, start)
+            except ValueError:
+                return  # The object is not complete yet
+            self.position = end
+            if isinstance(item, dict) and isinstance(item.get('id'), int) and isinstance(item.get('text'), str):
+                self._release(item['id'], item['text'].strip())
+
+
+def parse_response(response_text, expected_count, json_mode):
+    """Parse a reply, falling back to markers if a JSON reply is unusable.
+
+    A JSON reply that does not decode as a whole (usually one cut off by
+    the output limit) keeps its complete objects. Returns (translations,
+    parse_fallback).
+    """
+    if json_mode:
+        try:
+            return parse_json_response(response_text, expected_count), False
+        except ValueError:
+            translations = parse_partial_json_response(response_text, expected_count)
+            if any(translation is not None for translation in translations):
+                return translations, False
+    return parse_batch_response(response_text, expected_count), json_mode
+
+
+class TranslationBackend:
+    """Base class for translation backends.
+
+    Subclasses implement generate(), which sends one prompt with one key,
+    along with system_instruction(json_mode), and returns (response_text,
+    total_tokens, prompt_tokens); the token counts are None if the service
+    does not report them. Prompt building and response parsing are shared
+    so every backend goes through the same parser.
+    Pass a RunMetrics as `metrics` to have each stage timed.
+    """
+
+    name = 'base'
+
+    def __init__(self, key_count):
+        self.key_count = key_count
+
+    def setup_key(self, key_index):
+        """Prepare whatever a key needs (clients, sessions); may raise"""
+
+    def estimate_tokens(self, texts):
+        """Token budget for a request: instructions and prompt plus a reply of similar size"""
+        prompt_tokens = estimate_tokens(system_instruction(True)) + estimate_tokens(build_prompt(texts))
+        return prompt_tokens + estimate_tokens("".join(texts))
+
+    def translate_batch(self, key_index, texts, json_mode=True, metrics=None, on_item=None):
+        """Translate texts using one key; returns a BatchResult.
+
+        With on_item the reply is streamed and on_item(index, translation)
+        is called as each item arrives. If the stream breaks after some
+        items, they are returned with the error in stream_error instead of
+        raising, so only the rest needs to be asked for again.
+        """
+        def stage(name):
+            return metrics.stage(name) if metrics is not None else nullcontext()
+
+        with stage('prompt_build'):
+            prompt = build_prompt(texts)
+        stream_error = None
+        if on_item is None:
+            with stage('network'):
+                response_text, total_tokens, prompt_tokens = self.generate(key_index, prompt, texts, json_mode)
+            with stage('response_parse'):
+                translations, parse_fallback = parse_response(response_text, len(texts), json_mode)
+        else:
+            parser = IncrementalReplyParser(len(texts), json_mode, on_item)
+            total_tokens = prompt_tokens = None
+            with stage('network'):
+                try:
+                    for chunk, tokens, prompt_count in self.generate_stream(key_index, prompt, texts, json_mode):
+                        parser.feed(chunk)
+                        total_tokens = tokens or total_tokens
+                        prompt_tokens = prompt_count or prompt_tokens
+                except Exception as e:
+                    if not parser.received:
+                        raise
+                    stream_error = e
+            with stage('response_parse'):
+                translations, parse_fallback = parser.finish(complete=stream_error is None)
+            response_text = parser.buffer
+
+        if metrics is not None:
+            metrics.add('prompt_chars', len(prompt))
+            metrics.add('response_chars', len(response_text))
+            estimated = estimate_tokens(system_instruction(json_mode)) + estimate_tokens(prompt)
+            metrics.add('estimated_prompt_tokens', estimated)
+            # Counted tokens where the service reports them, the estimate elsewhere
+            metrics.add('prompt_tokens', prompt_tokens or estimated)
+            if not prompt_tokens:
+                metrics.add('estimated_prompt_requests', 1)
+            if total_tokens:
+                metrics.add('total_tokens', total_tokens)
+        return BatchResult(translations, total_tokens, parse_fallback, stream_error, prompt_tokens)
+
+    def generate(self, key_index, prompt, texts, json_mode):
+        raise NotImplementedError
+
+    def generate_stream(self, key_index, prompt, texts, json_mode):
+        """Yield (text_chunk, total_tokens, prompt_tokens) as the reply arrives; one chunk unless overridden.
+
+        The token counts are None until (and unless) the service reports them.
+        """
+        yield self.generate(key_index, prompt, texts, json_mode)
+
+
+def usage_counts(response):
+    """(total_tokens, prompt_tokens) from a Gemini response's usage_metadata, None where missing"""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return None, None
+    return getattr(usage, 'total_token_count', None), getattr(usage, 'prompt_token_count', None)
+
+
+class GeminiBackend(TranslationBackend):
+    """Google Gemini via the google-genai SDK, one client per API key.
+
+    The SDK is imported and each key's client built on first use, so
+    startup costs nothing until the first request.
+    """
+
+    name = 'gemini'
+
+    def __init__(self, api_keys, model_name=MODEL_NAME):
+        super().__init__(len(api_keys))
+        self.api_keys = api_keys
+        self.model_name = model_name
+        self.clients = {}
+        self.configs = {}  # One request config per reply format, shared by every key
+        self.lock = threading.Lock()
+
+    def setup_key(self, key_index):
+        if not self.api_keys[key_index].strip():
+            raise ValueError("empty API key")
+
+    def client(self, key_index):
+        with self.lock:
+            if key_index not in self.clients:
+                from google import genai
+                self.clients[key_index] = genai.Client(api_key=self.api_keys[key_index])
+            return self.clients[key_index]
+
+    def config(self, json_mode):
+        with self.lock:
+            if json_mode not in self.configs:
+                from google.genai import types
+                options = {'system_instruction': system_instruction(json_mode)}
+                if json_mode:
+                    options.update(response_mime_type='application/json', response_schema=TRANSLATION_SCHEMA)
+                self.configs[json_mode] = types.GenerateContentConfig(**options)
+            return self.configs[json_mode]
+
+    def generate(self, key_index, prompt, texts, json_mode):
+        client = self.client(key_index)
+        config = self.config(json_mode)
+        from google.genai import errors
+
+        try:
+            response = client.models.generate_content(
+                model=self.model_name, contents=prompt, config=config
+            )
+        except errors.APIError as e:
+            if e.code == 429:
+                raise quota_error_from(e) from e
+            raise
+
+        total_tokens, prompt_tokens = usage_counts(response)
+        return response.text or "", total_tokens, prompt_tokens
+
+    def generate_stream(self, key_index, prompt, texts, json_mode):
+        client = self.client(key_index)
+        config = self.config(json_mode)
+        from google.genai import errors
+
+        try:
+            for response in client.models.generate_content_stream(
+                model=self.model_name, contents=prompt, config=config
+            ):
+                yield (response.text or "", *usage_counts(response))
+        except errors.APIError as e:
+            if e.code == 429:
+                raise quota_error_from(e) from e
+            raise
+
+
+class MockBackend(TranslationBackend):
+    """Offline stand-in for load-testing scheduling and retry behaviour.
+
+    Every fault is drawn from a RNG seeded by (seed, batch texts, attempt),
+    so the same run produces the same faults no matter how threads interleave.
+
+    latency            base seconds per request (plus up to `jitter` seconds)
+    quota_error_rate   chance of a 429; a float, or {key_index: rate}
+    exhausted_keys     keys that always answer 429 with their daily quota used up
+    truncate_rate      chance the reply is cut off part way
+    malformed_rate     chance a reply has a broken marker (or broken JSON)
+    english_rate       chance an item comes back untranslated
+    stream_break_rate  chance a streamed reply breaks off part way
+    """
+
+    name = 'mock'
+
+    def __init__(self, key_count, seed=0, latency=0.5, jitter=0.2, quota_error_rate=0.0,
+                 exhausted_keys=(), truncate_rate=0.0, malformed_rate=0.0, english_rate=0.0,
+                 stream_break_rate=0.0, stream_chunks=8):
+        super().__init__(key_count)
+        self.seed = seed
+        self.latency = latency
+        self.jitter = jitter
+        self.quota_error_rate = quota_error_rate
+        self.exhausted_keys = set(exhausted_keys)
+        self.truncate_rate = truncate_rate
+        self.malformed_rate = malformed_rate
+        self.english_rate = english_rate
+        self.stream_break_rate = stream_break_rate
+        self.stream_chunks = stream_chunks
+        self.lock = threading.Lock()
+        self.attempts = {}
+
+    def rng_for(self, texts):
+        key = "\x1f".join(texts)
+        with self.lock:
+            attempt = self.attempts.get(key, 0)
+            self.attempts[key] = attempt + 1
+        return random.Random(f"{self.seed}:{attempt}:{key}")
+
+    def generate(self, key_index, prompt, texts, json_mode):
+        rng = self.rng_for(texts)
+        time.sleep(self.latency + rng.random() * self.jitter)
+        return self.reply(rng, key_index, prompt, texts, json_mode)
+
+    def generate_stream(self, key_index, prompt, texts, json_mode):
+        rng = self.rng_for(texts)
+        latency = self.latency + rng.random() * self.jitter
+        response_text, total_tokens, prompt_tokens = self.reply(rng, key_index, prompt, texts, json_mode)
+        break_at = rng.randrange(self.stream_chunks) if rng.random() < self.stream_break_rate else None
+
+        # The reply arrives in equal pieces spread over the request's latency
+        size = max(1, -(-len(response_text) // self.stream_chunks))
+        for number in range(self.stream_chunks):
+            time.sleep(latency / self.stream_chunks)
+            if number == break_at:
+                raise ConnectionError(f"Stream interrupted (mock key {key_index + 1})")
+            yield response_text[number * size:(number + 1) * size], None, None
+        yield "", total_tokens, prompt_tokens
+
+    def reply(self, rng, key_index, prompt, texts, json_mode):
+        """Build a reply with its faults drawn from rng; returns (response_text, total_tokens, prompt_tokens)"""
+        quota_rate = self.quota_error_rate
+        if isinstance(quota_rate, dict):
+            quota_rate = quota_rate.get(key_index, 0.0)
+        if key_index in self.exhausted_keys:
+            raise QuotaExceededError(f"429 Daily quota exhausted (mock key {key_index + 1})", daily=True)
+        if rng.random() < quota_rate:
+            raise QuotaExceededError(f"429 Resource has been exhausted (mock key {key_index + 1})", retry_after=30)
+
+        translations = [
+            text if rng.random() < self.english_rate else f"සිං {text}"
+            for text in texts
+        ]
+
+        if json_mode:
+            response_text = json.dumps(
+                [{'id': i + 1, 'text': text} for i, text in enumerate(translations)],
+                ensure_ascii=False
+            )
+            if rng.random() < self.malformed_rate:
+                response_text = response_text[:-1]  # Unterminated array
+        else:
+            items = [f"[{i+1}] {text}" for i, text in enumerate(translations)]
+            if items and rng.random() < self.malformed_rate:
+                broken = rng.randrange(len(items))
+                items[broken] = items[broken].replace(f"[{broken+1}]", f"{broken+1}.", 1)
+            response_text = "\n\n".join(items)
+
+        if rng.random() < self.truncate_rate:
+            response_text = response_text[:rng.randrange(len(response_text) + 1)]
+
+        # Reported like a real service would, from the text the request carried
+        prompt_tokens = estimate_tokens(system_instruction(json_mode)) + estimate_tokens(prompt)
+        return response_text, prompt_tokens + estimate_tokens(response_text), prompt_tokens
+
+
+def create_backend(name, api_keys, **options):
+    """Build a backend by name ('gemini' or 'mock')"""
+    if name == 'gemini':
+        return GeminiBackend(api_keys, **options)
+    if name == 'mock':
+        return MockBackend(len(api_keys), **options)
+    raise ValueError(f"Unknown backend: {name}")
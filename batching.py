@@ -0,0 +1,100 @@
+"""Batch packing by character budget, with a budget that tunes itself during a run"""
+import threading
+
+from translation_memory import normalize_text
+
+
+def create_batches(subtitles, batch_size):
+    """Create batches of subtitles for processing"""
+    batches = []
+    for i in range(0, len(subtitles), batch_size):
+        batches.append(subtitles[i:i + batch_size])
+    return batches
+
+
+def deduplicate_cues(subtitles, positions):
+    """Group cues with identical normalized text into translation units.
+
+    Returns a list of position lists in first-occurrence order; only the
+    first cue of each unit is sent to the API.
+    """
+    units = {}
+    for position in positions:
+        units.setdefault(normalize_text(subtitles[position].text), []).append(position)
+    return list(units.values())
+
+
+def iter_batches(units, subtitles, batch_size, sizer=None):
+    """Yield batches of units lazily.
+
+    With a sizer each batch is packed against its current character budget
+    at the moment the batch is requested; otherwise batches hold a fixed
+    number of units.
+    """
+    if sizer is None:
+        yield from create_batches(units, batch_size)
+        return
+
+    unit_chars = [len(subtitles[unit[0]].text) for unit in units]
+    start = 0
+    while start < len(units):
+        end = sizer.pack(unit_chars, start)
+        yield units[start:end]
+        start = end
+
+
+class AdaptiveBatchSizer:
+    """Additive-increase / multiplicative-decrease character budget for batches.
+
+    The budget grows while full batches come back quickly and complete, and
+    shrinks when a response is slow, truncated or missing [n] markers.
+    """
+
+    def __init__(self, initial_chars, min_chars=200, max_chars=12000, max_items=100,
+                 target_latency=20.0):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.max_items = max_items
+        self.target_latency = target_latency
+        self.budget = max(min_chars, min(max_chars, int(initial_chars)))
+        self.ceiling = None  # Size of the last truncated batch
+        self.lock = threading.Lock()
+
+    def pack(self, lengths, start):
+        """Return the end index of the next batch of items starting at `start`"""
+        budget = self.budget
+        end = start
+        used = 0
+        while end < len(lengths) and end - start < self.max_items:
+            # Always take at least one item, even if it is over budget
+            if end > start and used + lengths[end] > budget:
+                break
+            used += lengths[end]
+            end += 1
+        return end
+
+    def observe(self, chars, latency, expected, received):
+        """Feed back the outcome of one request"""
+        with self.lock:
+            if received < expected:
+                if chars < self.budget * 0.8:
+                    # A short request losing items says nothing about full batches,
+                    # so it must not drag the ceiling below the budget
+                    return
+                # A truncated reply shows roughly how much fits; aim a bit below it
+                self.ceiling = chars
+                if received:
+                    target = int(chars * received / expected * 0.9)
+                else:
+                    target = self.budget // 2
+                self.budget = max(self.min_chars, min(self.budget, target))
+            elif latency > self.target_latency:
+                self.budget = max(self.min_chars, int(self.budget * 0.75))
+            elif chars >= self.budget * 0.8:
+                # Only a (nearly) full batch says anything about a bigger one
+                step = max(50, self.budget // 10)
+                if self.ceiling is not None:
+                    # Creep back towards the size that last failed instead of jumping over it
+                    self.ceiling = int(self.ceiling * 1.02)
+                    step = min(step, max(0, int(self.ceiling * 0.95) - self.budget))
+                self.budget = min(self.max_chars, self.budget + step)
@@ -0,0 +1,375 @@
+"""Headless command line for translating many subtitle files without a window.
+
+Accepts files, directories and glob patterns, and translates several files
+at once against one shared key budget:
+
+    python cli.py "Season 1/" "extras/*.srt" --jobs 3 --json
+
+With --pool the files are translated as one pool of cues instead: batches
+are packed across files and lines repeated between episodes are sent once.
+
+A revised subtitle file can reuse the translation of its earlier version,
+so only new and edited lines are sent:
+
+    python cli.py movie_v2.srt --previous movie_v1.srt movie_v1_sinhala.srt
+
+--dry-run reports the requests, tokens, cost, per-key schedule and
+predicted time of a run without calling the API.
+
+API keys come from --api-key (repeatable), --keys-file (one per line) or the
+GEMINI_API_KEYS environment variable (comma separated). Progress goes to
+stdout, as JSON lines with --json; the exit code is 1 if any file failed.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from backends import create_backend
+from key_health import DEFAULT_HEALTH_PATH
+from planner import INPUT_PRICE, OUTPUT_PRICE, format_plan, plan_translation
+from translator import TranslationEngine, TranslationJob, PooledTranslationJob
+
+OUTPUT_SUFFIX = '_sinhala'
+
+
+def expand_inputs(patterns, recursive=False):
+    """Resolve files, directories and globs to a de-duplicated list of paths.
+
+    Directories contribute their .srt files, minus earlier outputs
+    (*_sinhala.srt). Patterns that match nothing are returned separately.
+    """
+    files = []
+    missing = []
+    seen = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            directory = Path(pattern)
+            matches = sorted(
+                str(path) for path in (directory.rglob('*') if recursive else directory.iterdir())
+                if path.is_file() and path.suffix.lower() == '.srt'
+                and not path.stem.endswith(OUTPUT_SUFFIX)
+            )
+        elif os.path.isfile(pattern):
+            matches = [pattern]
+        else:
+            matches = sorted(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+
+        if not matches:
+            missing.append(pattern)
+        for path in matches:
+            resolved = os.path.abspath(path)
+            if resolved not in seen:
+                seen.add(resolved)
+                files.append(path)
+    return files, missing
+
+
+def output_path_for(input_file, output_dir=None):
+    """<name>_sinhala.srt next to the input, or inside output_dir"""
+    source = Path(input_file)
+    directory = Path(output_dir) if output_dir else source.parent
+    return str(directory / f"{source.stem}{OUTPUT_SUFFIX}.srt")
+
+
+def load_api_keys(args):
+    """Collect API keys from the command line, a keys file and the environment"""
+    keys = list(args.api_key or [])
+    if args.keys_file:
+        with open(args.keys_file, 'r', encoding='utf-8') as file:
+            keys += [line.strip() for line in file if line.strip() and not line.startswith('#')]
+    keys += [key.strip() for key in os.environ.get('GEMINI_API_KEYS', '').split(',') if key.strip()]
+    return list(dict.fromkeys(keys))
+
+
+def add_engine_arguments(parser):
+    """Arguments for the keys, backend and budgets of a TranslationEngine (shared with server.py)"""
+    parser.add_argument('--api-key', action='append', help="API key (repeat for several keys)")
+    parser.add_argument('--keys-file', help="file with one API key per line")
+    parser.add_argument('--backend', default=os.environ.get('SINHALASUBGEN_BACKEND', 'gemini'),
+                        choices=['gemini', 'mock'])
+    parser.add_argument('--batch-size', type=int, default=15)
+    parser.add_argument('--rpm', type=int, default=10, help="requests per minute per API key")
+    parser.add_argument('--requests-per-day', type=int, help="daily request quota per API key, if known")
+    parser.add_argument('--key-health-file', default=str(DEFAULT_HEALTH_PATH),
+                        help="where key cooldowns and daily usage are remembered between runs")
+    parser.add_argument('--stream', action='store_true', help="stream replies and write each cue as it arrives")
+    parser.add_argument('-v', '--verbose', action='store_true', help="print the translation log to stderr")
+
+
+def create_engine(parser, args):
+    """Build and check the engine described by add_engine_arguments; None if no key is usable"""
+    api_keys = load_api_keys(args)
+    if not api_keys:
+        if args.backend != 'mock':
+            parser.error("no API keys: use --api-key, --keys-file or GEMINI_API_KEYS")
+        api_keys = [f"mock-key-{i + 1}" for i in range(4)]
+
+    log_lock = threading.Lock()
+
+    def log(message):
+        if args.verbose:
+            with log_lock:
+                print(message, file=sys.stderr, flush=True)
+
+    engine = TranslationEngine(
+        api_keys, backend=create_backend(args.backend, api_keys), log=log,
+        requests_per_minute=max(1, args.rpm), key_health_path=args.key_health_file,
+        requests_per_day=args.requests_per_day
+    )
+    engine.batch_size = max(1, args.batch_size)
+    engine.streaming = args.stream
+    engine.setup_models()
+    if not engine.ready_keys:
+        print("❌ No API key could be initialized", file=sys.stderr)
+        return None
+    return engine
+
+
+class ProgressReporter:
+    """Prints per-file events to stdout, as text or JSON lines"""
+
+    def __init__(self, json_output=False, interval=1.0, stream=None):
+        self.json_output = json_output
+        self.interval = interval
+        self.stream = stream or sys.stdout
+        self.lock = threading.Lock()
+        self.last_progress = {}
+
+    def emit(self, event, file, **fields):
+        with self.lock:
+            if self.json_output:
+                self.stream.write(json.dumps({'event': event, 'file': file, **fields}, ensure_ascii=False) + "\n")
+            else:
+                self.stream.write(self.format_text(event, file, fields) + "\n")
+            self.stream.flush()
+
+    def format_text(self, event, file, fields):
+        name = os.path.basename(file) if file else ''
+        if event == 'progress':
+            return f"⏳ {name}: {fields['percent']:.0f}% ({fields['completed']}/{fields['total']} lines)"
+        if event == 'done':
+            return f"✅ {name}: {fields['cues']} cues in {fields['seconds']:.1f}s -> {fields['output']}"
+        if event == 'failed':
+            return f"❌ {name}: {fields['error']}"
+        if event == 'skipped':
+            return f"⏭️ {name}: {fields['reason']}"
+        if event == 'pool':
+            if 'saved_calls' in fields:
+                about = "~" if fields.get('saved_calls_estimated') else ""
+                return f"📦 Pool: {fields['batches']} batches, {about}{fields['saved_calls']} API calls saved by deduplication"
+            return f"📦 Pool: {fields['batches']} batches, {fields.get('duplicate_cues', 0)} duplicate cues merged"
+        if event == 'summary':
+            return (f"📊 {fields['completed']} completed, {fields['failed']} failed, "
+                    f"{fields['skipped']} skipped in {fields['seconds']:.1f}s")
+        return f"🔄 {name}: {event}"
+
+    def progress(self, file, completed, total):
+        """Report a file's progress, at most once per interval per file"""
+        if not total:
+            return  # Still parsing, or nothing left to send
+        now = time.time()
+        with self.lock:
+            if now - self.last_progress.get(file, 0) < self.interval:
+                return
+            self.last_progress[file] = now
+        self.emit('progress', file, completed=completed, total=total,
+                  percent=round(completed / total * 100, 1))
+
+
+def translate_file(engine, input_file, output_file, reporter, log, jobs, stopping, previous=None):
+    """Translate one file; returns a list with its outcome: 'completed', 'failed' or 'skipped'"""
+    if stopping.is_set():
+        return ['skipped']
+
+    name = os.path.basename(input_file)
+    job = TranslationJob(
+        engine, input_file, output_file,
+        log=lambda message: log(f"[{name}] {message}"),
+        on_progress=lambda **state: reporter.progress(input_file, job.completed_units, job.total_units),
+        previous=previous
+    )
+    jobs.append(job)
+    reporter.emit('start', input_file, output=output_file)
+    try:
+        summary = job.run()
+    except Exception as e:
+        reporter.emit('failed', input_file, error=str(e))
+        return ['failed']
+
+    if summary['status'] == 'completed':
+        reporter.emit('done', input_file, output=output_file, **{k: v for k, v in summary.items() if k != 'status'})
+        return ['completed']
+    error = "no subtitles found" if summary['status'] == 'empty' else "stopped"
+    reporter.emit('failed', input_file, error=error)
+    return ['failed']
+
+
+def translate_pool(engine, work, reporter, log, jobs, metrics_path=None):
+    """Translate all files as one pooled job; returns one outcome per file"""
+    def report_progress(**state):
+        for task in job.files:
+            if task.summary is None:
+                reporter.progress(task.input_file, task.completed_cues, task.total_cues)
+
+    def report_done(task):
+        reporter.emit('done', task.input_file, output=task.output_file,
+                      **{k: v for k, v in task.summary.items() if k != 'status'})
+
+    job = PooledTranslationJob(
+        engine, work, log=log, on_progress=report_progress, on_file_done=report_done,
+        metrics_path=metrics_path
+    )
+    jobs.append(job)
+    for input_file, output_file in work:
+        reporter.emit('start', input_file, output=output_file)
+    try:
+        summary = job.run()
+    except Exception as e:
+        for input_file, output_file in work:
+            reporter.emit('failed', input_file, error=str(e))
+        return ['failed'] * len(work)
+
+    outcomes = []
+    for task in job.files:
+        status = task.summary['status']
+        if status == 'completed':
+            outcomes.append('completed')
+            continue
+        errors = {'empty': "no subtitles found", 'stopped': "stopped"}
+        reporter.emit('failed', task.input_file, error=task.summary.get('error') or errors[status])
+        outcomes.append('failed')
+    reporter.emit('pool', None, **{k: v for k, v in summary.items() if k not in ('status', 'files')})
+    return outcomes
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Translate English SRT subtitles to Sinhala without a GUI")
+    parser.add_argument('inputs', nargs='+', help="SRT files, directories or glob patterns")
+    parser.add_argument('-o', '--output-dir', help="write outputs here instead of next to each input")
+    parser.add_argument('-r', '--recursive', action='store_true', help="search directories recursively")
+    parser.add_argument('--skip-existing', action='store_true', help="skip files whose output already exists")
+    parser.add_argument('--previous', nargs=2, metavar=('OLD_ENGLISH', 'OLD_SINHALA'),
+                        help="earlier version of a single input and its translation; unchanged lines are reused")
+    add_engine_arguments(parser)
+    parser.add_argument('-j', '--jobs', type=int, default=2, help="files translated at the same time")
+    parser.add_argument('--pool', action='store_true', help="translate all files as one pool of cues (ignores --jobs)")
+    parser.add_argument('--concurrency', type=int, help="requests in flight per file (default: one per key)")
+    parser.add_argument('--no-rotate', dest='auto_rotate', action='store_false', help="use only the first key")
+    parser.add_argument('--no-memory', dest='use_memory', action='store_false', help="disable the translation memory")
+    parser.add_argument('--no-adaptive', dest='adaptive_batching', action='store_false', help="fixed-size batches")
+    parser.add_argument('--marker-mode', dest='json_mode', action='store_false', help="use [n] markers instead of JSON")
+    parser.add_argument('--retry-budget', type=float, default=0.5,
+                        help="retries allowed per batch over the whole run, not counting rate limits or repairs")
+    parser.add_argument('--hedge', action='store_true', help="resend straggling requests on a second key")
+    parser.add_argument('--hedge-percentile', type=float, default=95,
+                        help="hedge requests slower than this percentile of recent latencies")
+    parser.add_argument('--hedge-budget', type=float, default=0.1, help="extra requests allowed per request for hedges")
+    parser.add_argument('--metrics', action='store_true', help="write a metrics report next to each output")
+    parser.add_argument('--profile', action='store_true', help="also write a cProfile dump per file")
+    parser.add_argument('--dry-run', action='store_true', help="plan the run without calling the API")
+    parser.add_argument('--input-price', type=float, default=INPUT_PRICE, help="US$ per million prompt tokens")
+    parser.add_argument('--output-price', type=float, default=OUTPUT_PRICE, help="US$ per million output tokens")
+    parser.add_argument('--json', dest='json_output', action='store_true', help="print progress as JSON lines")
+    parser.add_argument('--progress-interval', type=float, default=1.0, help="seconds between progress lines per file")
+    return parser, parser.parse_args(argv)
+
+
+def main(argv=None):
+    parser, args = parse_args(argv)
+
+    files, missing = expand_inputs(args.inputs, args.recursive)
+    if not files and not missing:
+        parser.error("no input files found")
+    if args.previous and (len(files) != 1 or missing or args.pool):
+        parser.error("--previous needs exactly one input file")
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    engine = create_engine(parser, args)
+    if engine is None:
+        return 1
+    log = engine.log
+    if args.concurrency:
+        engine.max_in_flight = max(1, args.concurrency)
+    engine.auto_rotate = args.auto_rotate
+    engine.use_memory = args.use_memory
+    engine.adaptive_batching = args.adaptive_batching
+    engine.json_mode = args.json_mode
+    engine.retry_budget = max(0.0, args.retry_budget)
+    engine.hedge_requests = args.hedge
+    engine.hedge_policy.percentile = min(100.0, max(0.0, args.hedge_percentile))
+    engine.hedge_policy.budget = max(0.0, args.hedge_budget)
+    engine.export_metrics_enabled = args.metrics or args.profile
+    engine.profile_run = args.profile
+
+    reporter = ProgressReporter(args.json_output, args.progress_interval)
+    outcomes = {'completed': 0, 'failed': 0, 'skipped': 0}
+    for pattern in missing:
+        reporter.emit('failed', pattern, error="no such file")
+        outcomes['failed'] += 1
+
+    work = []
+    for input_file in files:
+        output_file = output_path_for(input_file, args.output_dir)
+        if args.skip_existing and os.path.exists(output_file):
+            reporter.emit('skipped', input_file, reason="output exists", output=output_file)
+            outcomes['skipped'] += 1
+        else:
+            work.append((input_file, output_file))
+
+    if args.dry_run:
+        jobs = 1 if args.pool else max(1, min(args.jobs, len(work)))
+        plan = plan_translation(
+            engine, work, pooled=args.pool, concurrency=engine.max_in_flight * jobs,
+            input_price=args.input_price, output_price=args.output_price
+        )
+        if args.json_output:
+            print(json.dumps({'event': 'plan', **plan}, ensure_ascii=False))
+        else:
+            print("\n".join(format_plan(plan)))
+        return 0
+
+    # Files run as threads of one process so every job draws on the same
+    # KeyScheduler; the work is network bound, so threads are enough
+    started = time.time()
+    stopping = threading.Event()
+    jobs = []
+    interrupted = False
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        if args.pool:
+            futures = [pool.submit(translate_pool, engine, work, reporter, log, jobs)] if work else []
+        else:
+            futures = [
+                pool.submit(
+                    translate_file, engine, input_file, output_file, reporter, log, jobs, stopping, args.previous
+                )
+                for input_file, output_file in work
+            ]
+        try:
+            for future in futures:
+                future.result()
+        except KeyboardInterrupt:
+            # Stop cleanly so journals are kept and a rerun resumes
+            interrupted = True
+            stopping.set()
+            for job in list(jobs):
+                job.stop()
+    engine.evict_memory()
+
+    for future in futures:
+        for outcome in future.result():
+            outcomes[outcome] += 1
+    reporter.emit('summary', None, seconds=round(time.time() - started, 3), **outcomes)
+    if interrupted:
+        return 130
+    return 1 if outcomes['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+"""Hedged requests: resend a straggling batch on a second key, keep the first answer"""
+import threading
+from collections import deque
+
+
+class HedgePolicy:
+    """Decides when a request is slow enough to hedge, within an extra-request budget.
+
+    A request is hedged once it has run longer than `percentile` of the
+    recent successful latencies (but at least `min_delay` seconds). Hedges
+    may add at most `budget` extra requests per regular request, e.g. 0.1
+    allows one hedge per ten requests.
+    """
+
+    def __init__(self, percentile=95, budget=0.1, min_samples=10, min_delay=1.0, window=200):
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.hedges = 0
+        self.lock = threading.Lock()
+
+    def record(self, latency):
+        """Feed back the latency of a successful request"""
+        with self.lock:
+            self.latencies.append(latency)
+
+    def count_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def delay(self):
+        """Seconds to wait before hedging, or None while there are too few samples"""
+        with self.lock:
+            if len(self.latencies) < self.min_samples:
+                return None
+            ordered = sorted(self.latencies)
+        rank = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return max(self.min_delay, ordered[rank])
+
+    def try_spend(self):
+        """Reserve one hedge if the budget allows it"""
+        with self.lock:
+            if self.budget <= 0 or self.hedges + 1 > max(1, self.requests * self.budget):
+                return False
+            self.hedges += 1
+            return True
+
+    def refund(self):
+        """Give back a reserved hedge that could not be sent"""
+        with self.lock:
+            self.hedges -= 1
@@ -0,0 +1,96 @@
+"""Append-only JSONL journal of completed batches for resumable translation jobs"""
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+
+def hash_file(file_path):
+    """SHA-256 of a file's contents, read in chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TranslationJournal:
+    """Journal stored next to the output file as <output>.journal.jsonl.
+
+    The first line is a header holding the input file hash; every other line
+    records the translations of one finished batch as [positions, text] pairs.
+    """
+
+    def __init__(self, output_file):
+        self.path = Path(f"{output_file}.journal.jsonl")
+        self.lock = threading.Lock()
+        self.file = None
+        self.valid_length = None  # Bytes up to the last complete record, set by load()
+
+    def load(self, input_hash):
+        """Return {position: text} from a journal made for the same input file.
+
+        A missing journal, or one written for a different input, yields {}.
+        A torn last line (from a crash mid-write) is ignored, and cut off
+        when the journal is opened again for resuming.
+        """
+        self.valid_length = None
+        if not self.path.exists():
+            return {}
+
+        entries = {}
+        with open(self.path, 'rb') as file:
+            try:
+                header = json.loads(file.readline())
+            except ValueError:
+                return {}
+            if header.get('input_sha256') != input_hash:
+                return {}
+            valid_length = file.tell()
+
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break  # Torn by a crash mid-write
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                for positions, text in record['items']:
+                    for position in positions:
+                        entries[position] = text
+                valid_length += len(line)
+        self.valid_length = valid_length
+        return entries
+
+    def open(self, input_hash, resume):
+        """Start a fresh journal, or keep appending to the one being resumed"""
+        if resume:
+            self.file = open(self.path, 'a', encoding='utf-8')
+            if self.valid_length is not None:
+                # Drop a torn last line so new records do not get glued onto it
+                self.file.truncate(self.valid_length)
+        else:
+            self.file = open(self.path, 'w', encoding='utf-8')
+            self.file.write(json.dumps({'input_sha256': input_hash}) + "\n")
+            self.file.flush()
+
+    def record(self, items):
+        """Append one finished batch: a list of (positions, text) pairs"""
+        line = json.dumps({'items': [[list(positions), text] for positions, text in items]}, ensure_ascii=False)
+        with self.lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def remove(self):
+        """Delete the journal once the output file is complete"""
+        self.close()
+        if self.path.exists():
+            self.path.unlink()
@@ -0,0 +1,278 @@
+"""Per-key health with circuit breakers, persisted between runs.
+
+Each API key has a breaker:
+
+    closed     the key is in rotation
+    open       the key is cooling down (after a 429 or repeated errors)
+    half_open  the cooldown is over; one probe request decides whether the
+               key closes again or goes back to open with a longer cooldown
+
+State is keyed by a hash of the API key, never the key itself, and saved to
+~/.sinhalasubgen/key_health.json so a new run skips keys that are still
+cooling down or have used up their daily quota.
+"""
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_HEALTH_PATH = Path.home() / '.sinhalasubgen' / 'key_health.json'
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+def key_id(api_key):
+    """Stable identifier for a key that does not reveal it"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+
+
+def pacific_offset_zone(now):
+    """US Pacific time as a fixed offset, for systems without time zone data.
+
+    Daylight saving runs from the second Sunday of March to the first
+    Sunday of November, switching at 2:00 local time.
+    """
+    utc = datetime.datetime.fromtimestamp(now, datetime.timezone.utc)
+
+    def sunday(month, nth, utc_hour):
+        first = datetime.datetime(utc.year, month, 1, utc_hour, tzinfo=datetime.timezone.utc)
+        return first + datetime.timedelta(days=(6 - first.weekday()) % 7 + 7 * (nth - 1))
+
+    daylight = sunday(3, 2, 10) <= utc < sunday(11, 1, 9)
+    return datetime.timezone(datetime.timedelta(hours=-7 if daylight else -8))
+
+
+def quota_day_end(now):
+    """Wall-clock time of the next daily quota reset (midnight US Pacific time)"""
+    try:
+        from zoneinfo import ZoneInfo
+        zone = ZoneInfo('America/Los_Angeles')
+    except Exception:
+        # No IANA database (Windows without the tzdata package)
+        zone = pacific_offset_zone(now)
+    today = datetime.datetime.fromtimestamp(now, zone).date()
+    midnight = datetime.datetime.combine(today + datetime.timedelta(days=1), datetime.time(), zone)
+    return midnight.timestamp()
+
+
+class KeyHealth:
+    """Health record of one API key"""
+
+    def __init__(self):
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.last_429 = None
+        self.retry_after = None  # Last retry-after hint from the API, in seconds
+        self.open_until = 0.0
+        self.cooldown = 0.0  # Length of the current cooldown, doubled on failed probes
+        self.reason = None
+        self.quota_day_end = 0.0
+        self.day_requests = 0
+        self.day_tokens = 0
+        self.probing = False
+
+    def to_dict(self):
+        return {
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'last_429': self.last_429,
+            'retry_after': self.retry_after,
+            'open_until': self.open_until,
+            'cooldown': self.cooldown,
+            'reason': self.reason,
+            'quota_day_end': self.quota_day_end,
+            'day_requests': self.day_requests,
+            'day_tokens': self.day_tokens,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        health = cls()
+        for name, value in data.items():
+            if name in health.to_dict():
+                setattr(health, name, value)
+        if health.state == HALF_OPEN:
+            health.state = OPEN  # A probe cannot survive a restart; run it again
+        return health
+
+
+class KeyHealthTracker:
+    """Circuit breakers and daily usage for a list of API keys; thread safe.
+
+    failure_threshold  consecutive errors (not 429s) that open a breaker
+    base_cooldown      first cooldown in seconds, doubled on every failed probe
+    requests_per_day   daily request quota per key, if known
+    path               JSON file to persist to, or None to keep state in memory
+    """
+
+    def __init__(self, api_keys, path=DEFAULT_HEALTH_PATH, failure_threshold=3, base_cooldown=60.0,
+                 max_cooldown=3600.0, requests_per_day=None):
+        self.ids = [key_id(api_key) for api_key in api_keys]
+        self.path = Path(path) if path else None
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.requests_per_day = requests_per_day
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.keys = [KeyHealth() for _ in api_keys]
+        self.stored = {}  # Records of keys not in this run, kept on save
+        self.load()
+
+    def load(self):
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                self.stored = json.load(file).get('keys', {})
+        except (OSError, ValueError, AttributeError):
+            self.stored = {}
+            return
+        for i, identifier in enumerate(self.ids):
+            if isinstance(self.stored.get(identifier), dict):
+                self.keys[i] = KeyHealth.from_dict(self.stored[identifier])
+
+    def save(self):
+        """Write the state of every key atomically"""
+        if self.path is None:
+            return
+        with self.lock:
+            records = dict(self.stored)
+            records.update({identifier: health.to_dict() for identifier, health in zip(self.ids, self.keys)})
+        with self.save_lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.path.with_name(self.path.name + '.tmp')
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump({'keys': records}, file, indent=2)
+            os.replace(temp_path, self.path)
+
+    def _roll_day(self, health, now):
+        if now >= health.quota_day_end:
+            health.quota_day_end = quota_day_end(now)
+            health.day_requests = 0
+            health.day_tokens = 0
+            if health.reason == 'daily quota exhausted':
+                health.open_until = min(health.open_until, now)
+
+    def wait_time(self, key_index, now=None):
+        """Seconds until the breaker lets a request through (0 if it does now)"""
+        now = time.time() if now is None else now
+        with self.lock:
+            health = self.keys[key_index]
+            self._roll_day(health, now)
+            if self.requests_per_day is not None and health.day_requests >= self.requests_per_day:
+                return health.quota_day_end - now
+            if health.state == CLOSED:
+                return 0.0
+            if now < health.open_until:
+                return health.open_until - now
+            # Cooldown over: exactly one probe at a time
+            return 1.0 if health.probing else 0.0
+
+    def on_dispatch(self, key_index):
+        """A request is about to be sent with this key"""
+        now = time.time()
+        with self.lock:
+            health = self.keys[key_index]
+            self._roll_day(health, now)
+            health.day_requests += 1
+            if health.state != CLOSED:
+                health.state = HALF_OPEN
+                health.probing = True
+
+    def record_success(self, key_index, tokens=None):
+        """A reply arrived; only the half-open probe closes an open breaker.
+
+        Requests sent before the breaker opened can still succeed
+        afterwards and must not put the key back into rotation, nor may
+        anything close it before a daily quota resets.
+        """
+        now = time.time()
+        with self.lock:
+            health = self.keys[key_index]
+            if tokens:
+                health.day_tokens += tokens
+            health.consecutive_failures = 0
+            if health.state != CLOSED:
+                self._roll_day(health, now)
+                daily = health.reason == 'daily quota exhausted' and now < health.open_until
+                if not health.probing or daily:
+                    return
+            changed = health.state != CLOSED
+            health.state = CLOSED
+            health.probing = False
+            health.cooldown = 0.0
+            health.reason = None
+        if changed:
+            self.save()
+
+    def record_failure(self, key_index):
+        """An error that is not a quota error (5xx, timeout, bad request)"""
+        with self.lock:
+            health = self.keys[key_index]
+            health.consecutive_failures += 1
+            opened = health.state != CLOSED or health.consecutive_failures >= self.failure_threshold
+            if opened:
+                self._open(health, time.time(), None, f"{health.consecutive_failures} consecutive errors")
+        if opened:
+            self.save()
+
+    def record_quota_error(self, key_index, retry_after=None, daily=False):
+        """A 429: park the key for retry_after, or until the daily reset if its day is used up"""
+        now = time.time()
+        with self.lock:
+            health = self.keys[key_index]
+            self._roll_day(health, now)
+            health.last_429 = now
+            health.retry_after = retry_after
+            if daily:
+                health.state = OPEN
+                health.probing = False
+                health.open_until = health.quota_day_end
+                health.reason = 'daily quota exhausted'
+            else:
+                self._open(health, now, retry_after, 'rate limited')
+        self.save()
+
+    def _open(self, health, now, seconds, reason):
+        if seconds is None:
+            # Back off exponentially while probes keep failing
+            if health.state == CLOSED:
+                seconds = self.base_cooldown
+            else:
+                seconds = min(self.max_cooldown, max(self.base_cooldown, health.cooldown * 2))
+            health.cooldown = seconds
+        health.state = OPEN
+        health.probing = False
+        health.open_until = max(health.open_until, now + seconds)
+        health.reason = reason
+
+    def remaining_daily_requests(self, key_index):
+        """Estimated requests left today, or None if the daily quota is unknown"""
+        if self.requests_per_day is None:
+            return None
+        with self.lock:
+            health = self.keys[key_index]
+            self._roll_day(health, time.time())
+            return max(0, self.requests_per_day - health.day_requests)
+
+    def describe(self):
+        """One line per key that is currently out of rotation"""
+        now = time.time()
+        lines = []
+        for i in range(len(self.keys)):
+            wait = self.wait_time(i, now)
+            if wait > 0:
+                health = self.keys[i]
+                duration = f"{wait:.0f}s" if wait < 120 else f"{wait / 60:.0f} min"
+                lines.append(f"API key {i + 1} cooling down for {duration} ({health.reason or 'daily quota used'})")
+        return lines
+
+    def to_dict(self):
+        with self.lock:
+            return {str(i + 1): health.to_dict() for i, health in enumerate(self.keys)}
@@ -0,0 +1,208 @@
+"""Structured per-run metrics with JSON and Prometheus text-format export"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, float('inf'))
+RETRY_BUCKETS = (0, 1, 2, 3, 5, 10, float('inf'))
+OUTCOMES = ('success', 'rate_limited', 'error')
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self):
+        return {
+            'buckets': {format_bound(bound): count for bound, count in zip(self.buckets, self.counts)},
+            'sum': round(self.sum, 6),
+            'count': self.count,
+        }
+
+
+def format_bound(bound):
+    return '+Inf' if bound == float('inf') else f"{bound:g}"
+
+
+class RunMetrics:
+    """Collects metrics for one translation run; safe to use from worker threads.
+
+    Stage times are summed over all threads, so with several requests in
+    flight 'network' can exceed the wall-clock time of the run.
+    """
+
+    def __init__(self, profile=False):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.finished = None
+        self.key_latency = {}
+        self.key_outcomes = {}
+        self.batch_retries = {}
+        self.retry_reasons = {}  # batch_num -> why each retry was needed
+        self.counters = {
+            'prompt_chars': 0,
+            'response_chars': 0,
+            'prompt_tokens': 0,
+            'estimated_prompt_tokens': 0,
+            'total_tokens': 0,
+        }
+        self.stage_seconds = {}
+        self.profile = profile
+        self.profilers = []
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block of work under a stage name"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + elapsed
+
+    def add(self, counter, amount):
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def record_request(self, key_index, latency, outcome):
+        """Record one API request: outcome is 'success', 'rate_limited' or 'error'"""
+        key = str(key_index + 1)
+        with self.lock:
+            if key not in self.key_latency:
+                self.key_latency[key] = Histogram(LATENCY_BUCKETS)
+                self.key_outcomes[key] = dict.fromkeys(OUTCOMES, 0)
+            self.key_latency[key].observe(latency)
+            self.key_outcomes[key][outcome] += 1
+
+    def record_retry(self, batch_num, reason=None):
+        with self.lock:
+            self.batch_retries[batch_num] = self.batch_retries.get(batch_num, 0) + 1
+            if reason:
+                self.retry_reasons.setdefault(batch_num, []).append(reason)
+
+    def retry_reason_counts(self):
+        """Number of retries per reason over the whole run"""
+        counts = {}
+        with self.lock:
+            for reasons in self.retry_reasons.values():
+                for reason in reasons:
+                    counts[reason] = counts.get(reason, 0) + 1
+        return counts
+
+    def record_batch(self, batch_num):
+        """Register a batch so batches without retries show up as zero"""
+        with self.lock:
+            self.batch_retries.setdefault(batch_num, 0)
+
+    def start_thread_profile(self):
+        """ThreadPoolExecutor initializer: profile this worker thread too"""
+        if self.profile:
+            import cProfile  # Only loaded when profiling
+            profiler = cProfile.Profile()
+            with self.lock:
+                self.profilers.append(profiler)
+            profiler.enable()
+
+    def finish(self):
+        self.finished = time.time()
+
+    def retry_histogram(self):
+        histogram = Histogram(RETRY_BUCKETS)
+        for retries in self.batch_retries.values():
+            histogram.observe(retries)
+        return histogram
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'started': self.started,
+                'wall_seconds': round((self.finished or time.time()) - self.started, 3),
+                'keys': {
+                    key: {'latency': self.key_latency[key].to_dict(), 'outcomes': dict(self.key_outcomes[key])}
+                    for key in sorted(self.key_latency, key=int)
+                },
+                'batches': len(self.batch_retries),
+                'retries_total': sum(self.batch_retries.values()),
+                'retries_per_batch': self.retry_histogram().to_dict(),
+                'retried_batches': {str(batch): list(reasons) for batch, reasons in sorted(self.retry_reasons.items())},
+                'counters': dict(self.counters),
+                'stage_seconds': {stage: round(seconds, 6) for stage, seconds in self.stage_seconds.items()},
+            }
+
+    def to_prometheus(self):
+        """Render the metrics in the Prometheus text exposition format"""
+        data = self.to_dict()
+        lines = [
+            "# HELP subgen_request_latency_seconds Translation request latency per API key",
+            "# TYPE subgen_request_latency_seconds histogram",
+        ]
+        for key, stats in data['keys'].items():
+            latency = stats['latency']
+            for bound, count in latency['buckets'].items():
+                lines.append(f'subgen_request_latency_seconds_bucket{{key="{key}",le="{bound}"}} {count}')
+            lines.append(f'subgen_request_latency_seconds_sum{{key="{key}"}} {latency["sum"]}')
+            lines.append(f'subgen_request_latency_seconds_count{{key="{key}"}} {latency["count"]}')
+
+        lines += [
+            "# HELP subgen_requests_total Translation requests per API key and outcome",
+            "# TYPE subgen_requests_total counter",
+        ]
+        for key, stats in data['keys'].items():
+            for outcome, count in stats['outcomes'].items():
+                lines.append(f'subgen_requests_total{{key="{key}",outcome="{outcome}"}} {count}')
+
+        retries = data['retries_per_batch']
+        lines += [
+            "# HELP subgen_batch_retries Extra requests needed per batch",
+            "# TYPE subgen_batch_retries histogram",
+        ]
+        for bound, count in retries['buckets'].items():
+            lines.append(f'subgen_batch_retries_bucket{{le="{bound}"}} {count}')
+        lines.append(f"subgen_batch_retries_sum {retries['sum']:g}")
+        lines.append(f"subgen_batch_retries_count {retries['count']}")
+
+        for counter, value in data['counters'].items():
+            lines.append(f"# TYPE subgen_{counter}_total counter")
+            lines.append(f"subgen_{counter}_total {value}")
+
+        lines += [
+            "# HELP subgen_stage_seconds_total Time spent per pipeline stage (summed over threads)",
+            "# TYPE subgen_stage_seconds_total counter",
+        ]
+        for stage, seconds in data['stage_seconds'].items():
+            lines.append(f'subgen_stage_seconds_total{{stage="{stage}"}} {seconds}')
+
+        return "\n".join(lines) + "\n"
+
+    def export(self, base_path):
+        """Write <base>.metrics.json, <base>.metrics.prom and, if profiling, <base>.prof"""
+        paths = [f"{base_path}.metrics.json", f"{base_path}.metrics.prom"]
+        with open(paths[0], 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(), file, indent=2)
+        with open(paths[1], 'w', encoding='utf-8') as file:
+            file.write(self.to_prometheus())
+
+        with self.lock:
+            profilers = list(self.profilers)
+        if profilers:
+            import pstats
+            stats = pstats.Stats(profilers[0])
+            for profiler in profilers[1:]:
+                stats.add(profiler)
+            paths.append(f"{base_path}.prof")
+            stats.dump_stats(paths[-1])
+        return paths
@@ -0,0 +1,224 @@
+"""Dry-run planning: what a job would send, and when, without calling the API.
+
+The files go through the same layers as a real run (parse, journal resume,
+translation memory, de-duplication, batching), then the batches are played
+through the per-key RPM/TPM buckets on a simulated clock to predict the
+schedule and the time to completion.
+"""
+import heapq
+import os
+
+from backends import build_prompt, system_instruction
+from batching import AdaptiveBatchSizer, deduplicate_cues, iter_batches
+from journal import TranslationJournal, hash_file
+from rate_limiter import TokenBucket, estimate_tokens
+from translation_memory import normalize_text
+
+# Assumed request time: a fixed overhead plus the time to generate the reply
+BASE_LATENCY = 1.0
+OUTPUT_TOKENS_PER_SECOND = 150.0
+
+# Default prices in US$ per million tokens; set them to your model's rates
+INPUT_PRICE = 0.10
+OUTPUT_PRICE = 0.40
+
+
+class _Text:
+    """Just enough of a cue for deduplicate_cues and iter_batches"""
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+
+def plan_cues(engine, file_pairs, pooled=True):
+    """Cues a job would still send, per file and in total.
+
+    Returns (files, units_per_group): one summary dict per file, and the
+    lists of unit texts that are batched together (one list for a pooled
+    job, one per file otherwise).
+    """
+    memory = engine.get_translation_memory()
+    files = []
+    groups = []
+    for input_file, output_file in file_pairs:
+        entry = {'file': input_file, 'cues': 0, 'resumed': 0, 'memory_hits': 0}
+        files.append(entry)
+        try:
+            subtitles = engine.parse_srt_file(input_file)
+        except (OSError, UnicodeDecodeError) as e:
+            entry['error'] = str(e)
+            continue
+        entry['cues'] = len(subtitles)
+
+        pending = list(range(len(subtitles)))
+        if output_file and subtitles:
+            restored = TranslationJournal(output_file).load(hash_file(input_file))
+            pending = [p for p in pending if p not in restored]
+            entry['resumed'] = len(subtitles) - len(pending)
+        if memory is not None and pending:
+            cached = memory.lookup_many((subtitles[p].text for p in pending), touch=False)
+            still_pending = [p for p in pending if normalize_text(subtitles[p].text) not in cached]
+            entry['memory_hits'] = len(pending) - len(still_pending)
+            pending = still_pending
+
+        texts = [subtitles[p].text for p in pending]
+        if pooled and groups:
+            groups[0].extend(texts)
+        else:
+            groups.append(texts)
+
+    units_per_group = []
+    for texts in groups:
+        units = deduplicate_cues([_Text(text) for text in texts], range(len(texts)))
+        units_per_group.append([texts[unit[0]] for unit in units])
+    return files, units_per_group
+
+
+def plan_batches(engine, unit_texts):
+    """Batches as the job would pack them (adaptive batching at its starting budget)"""
+    if not unit_texts:
+        return []
+    units = [[i] for i in range(len(unit_texts))]
+    cues = [_Text(text) for text in unit_texts]
+    sizer = None
+    if engine.adaptive_batching:
+        average_chars = sum(len(text) for text in unit_texts) / len(unit_texts)
+        sizer = AdaptiveBatchSizer(initial_chars=average_chars * engine.batch_size)
+    return [[unit_texts[unit[0]] for unit in batch] for batch in iter_batches(units, cues, engine.batch_size, sizer)]
+
+
+def simulate_schedule(engine, batches, concurrency, latency_for):
+    """Play the batches through the keys' RPM/TPM buckets on a simulated clock.
+
+    Uses the same buckets and key choice as KeyScheduler; keys that are
+    cooling down join when their breaker would let them, and keys that run
+    out of today's requests leave until the daily reset. Returns
+    (per_key, seconds, unscheduled).
+    """
+    keys = engine.ready_keys or list(range(len(engine.api_keys)))
+    if not engine.auto_rotate:
+        keys = keys[:1]
+    request_buckets = {}
+    token_buckets = {}
+    available_from = {}
+    remaining = {}
+    per_key = {}
+    for key in keys:
+        request_buckets[key] = TokenBucket(engine.requests_per_minute)
+        token_buckets[key] = TokenBucket(engine.tokens_per_minute)
+        request_buckets[key].updated = token_buckets[key].updated = 0.0
+        available_from[key] = engine.key_health.wait_time(key)
+        remaining[key] = engine.key_health.remaining_daily_requests(key)
+        per_key[key] = {'requests': 0, 'tokens': 0, 'first_request': None, 'last_request': None}
+
+    workers = [0.0] * max(1, concurrency)  # When each in-flight slot frees up
+    clock = 0.0  # Batches are dispatched in order, so the clock never runs back
+    finished = 0.0
+    unscheduled = 0
+    for texts in batches:
+        budget = engine.backend.estimate_tokens(texts)
+        now = max(clock, heapq.heappop(workers))
+        usable = [key for key in keys if remaining[key] is None or remaining[key] > 0]
+        if not usable:
+            unscheduled += 1
+            heapq.heappush(workers, now)
+            continue
+        waits = {
+            key: max(
+                available_from[key] - now,
+                request_buckets[key].wait_time(1, now),
+                token_buckets[key].wait_time(budget, now),
+            )
+            for key in usable
+        }
+        delay = max(0.0, min(waits.values()))
+        now += delay
+        clock = now
+        ready = [key for key in usable if waits[key] <= delay]
+        key = max(ready, key=lambda k: min(request_buckets[k].headroom(now), token_buckets[k].headroom(now)))
+        request_buckets[key].consume(1, now)
+        token_buckets[key].consume(budget, now)
+        if remaining[key] is not None:
+            remaining[key] -= 1
+
+        stats = per_key[key]
+        stats['requests'] += 1
+        stats['tokens'] += budget
+        if stats['first_request'] is None:
+            stats['first_request'] = now
+        stats['last_request'] = now
+        done = now + latency_for(texts)
+        finished = max(finished, done)
+        heapq.heappush(workers, done)
+    return per_key, finished, unscheduled
+
+
+def plan_translation(engine, file_pairs, pooled=True, concurrency=None,
+                     input_price=INPUT_PRICE, output_price=OUTPUT_PRICE):
+    """Plan a job over (input, output) pairs; returns a report dict (see format_plan)"""
+    files, groups = plan_cues(engine, file_pairs, pooled)
+    instruction_tokens = estimate_tokens(system_instruction(engine.json_mode))
+
+    batches = []
+    for unit_texts in groups:
+        batches.extend(plan_batches(engine, unit_texts))
+    pending_cues = sum(f['cues'] - f['resumed'] - f['memory_hits'] for f in files if 'error' not in f)
+    units = sum(len(unit_texts) for unit_texts in groups)
+    duplicates = pending_cues - units
+
+    prompt_tokens = sum(instruction_tokens + estimate_tokens(build_prompt(texts)) for texts in batches)
+    request_tokens = sum(engine.backend.estimate_tokens(texts) for texts in batches)
+    output_tokens = max(0, request_tokens - prompt_tokens)
+
+    def latency_for(texts):
+        return BASE_LATENCY + estimate_tokens("".join(texts)) / OUTPUT_TOKENS_PER_SECOND
+
+    per_key, seconds, unscheduled = simulate_schedule(
+        engine, batches, concurrency or engine.max_in_flight, latency_for
+    )
+    daily = [engine.key_health.remaining_daily_requests(key) for key in per_key]
+    return {
+        'files': files,
+        'cues': sum(f['cues'] for f in files),
+        'resumed': sum(f['resumed'] for f in files),
+        'memory_hits': sum(f['memory_hits'] for f in files),
+        'duplicates': duplicates,
+        'units': units,
+        'requests': len(batches),
+        'prompt_tokens': prompt_tokens,
+        'output_tokens': output_tokens,
+        'cost': round((prompt_tokens * input_price + output_tokens * output_price) / 1_000_000, 4),
+        'keys': {str(key + 1): stats for key, stats in per_key.items()},
+        'seconds': round(seconds, 1),
+        'unscheduled_requests': unscheduled,
+        'fits_daily_quota': None if None in daily else unscheduled == 0,
+    }
+
+
+def format_plan(plan):
+    """Human readable lines for a plan"""
+    lines = [
+        f"📋 {plan['cues']} cues in {len(plan['files'])} file(s): {plan['resumed']} resumed, "
+        f"{plan['memory_hits']} from memory, {plan['duplicates']} duplicates, {plan['units']} to translate",
+        f"📨 {plan['requests']} requests, ~{plan['prompt_tokens']} prompt + ~{plan['output_tokens']} output tokens "
+        f"(~${plan['cost']:.4f})",
+    ]
+    for key, stats in plan['keys'].items():
+        if stats['requests']:
+            lines.append(
+                f"🔑 API key {key}: {stats['requests']} requests, ~{stats['tokens']} tokens, "
+                f"from {stats['first_request']:.0f}s to {stats['last_request']:.0f}s"
+            )
+        else:
+            lines.append(f"🔑 API key {key}: idle")
+    minutes, seconds = divmod(plan['seconds'], 60)
+    lines.append(f"⏱️ Predicted time: {minutes:.0f} min {seconds:.0f}s")
+    if plan['unscheduled_requests']:
+        lines.append(f"⛔ {plan['unscheduled_requests']} requests do not fit in today's quota")
+    elif plan['fits_daily_quota']:
+        lines.append("✅ Fits in today's quota")
+    for entry in plan['files']:
+        if 'error' in entry:
+            lines.append(f"❌ {os.path.basename(entry['file'])}: {entry['error']}")
+    return lines
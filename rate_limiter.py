@@ -0,0 +1,158 @@
+"""Per-key request and token budgets for spreading load across API keys"""
+import threading
+import time
+
+
+def estimate_tokens(text):
+    """Rough token estimate for Gemini models (about 4 characters per token)"""
+    return max(1, len(text) // 4)
+
+
+class TokenBucket:
+    """Token bucket that refills to `capacity` over `period` seconds"""
+
+    def __init__(self, capacity, period=60.0):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` tokens are available (0 if available now)"""
+        self.refill(now)
+        amount = min(amount, self.capacity)  # Oversized requests only need a full bucket
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount, now):
+        self.refill(now)
+        self.tokens = min(self.capacity, self.tokens - min(amount, self.capacity))
+
+    def headroom(self, now):
+        """Fraction of the bucket currently available"""
+        self.refill(now)
+        return max(0.0, self.tokens) / self.capacity
+
+
+class NoKeyAvailable(Exception):
+    """Every allowed key is out of rotation for longer than the caller will wait"""
+
+    def __init__(self, message, wait_time):
+        super().__init__(message)
+        self.wait_time = wait_time
+
+
+class KeyScheduler:
+    """Picks the API key with the most headroom under per-key RPM/TPM limits.
+
+    With a KeyHealthTracker as `health`, keys whose circuit breaker is open
+    are skipped until their cooldown ends.
+    """
+
+    def __init__(self, key_count, requests_per_minute, tokens_per_minute, health=None):
+        self.lock = threading.Lock()
+        self.request_buckets = [TokenBucket(requests_per_minute) for _ in range(key_count)]
+        self.token_buckets = [TokenBucket(tokens_per_minute) for _ in range(key_count)]
+        self.health = health
+
+    def _wait_time(self, key_index, estimated_tokens, now):
+        return max(
+            self.health.wait_time(key_index) if self.health is not None else 0.0,
+            self.request_buckets[key_index].wait_time(1, now),
+            self.token_buckets[key_index].wait_time(estimated_tokens, now),
+        )
+
+    def _headroom(self, key_index, now):
+        return min(
+            self.request_buckets[key_index].headroom(now),
+            self.token_buckets[key_index].headroom(now),
+        )
+
+    def acquire(self, estimated_tokens, allowed_keys=None, abort=None, max_wait=None):
+        """Block until a key can take the request, then reserve its budget.
+
+        Returns the chosen key index, or None if `abort()` became true while
+        waiting. Raises NoKeyAvailable if there are no keys to choose from or
+        every key is out for more than `max_wait` seconds.
+        """
+        keys = list(allowed_keys) if allowed_keys is not None else list(range(len(self.request_buckets)))
+        if not keys:
+            raise NoKeyAvailable("No API key is available", float('inf'))
+        while True:
+            if abort is not None and abort():
+                return None
+
+            with self.lock:
+                now = time.monotonic()
+                waits = {i: self._wait_time(i, estimated_tokens, now) for i in keys}
+                ready = [i for i in keys if waits[i] <= 0]
+                if ready:
+                    key_index = max(ready, key=lambda i: self._headroom(i, now))
+                    self.request_buckets[key_index].consume(1, now)
+                    self.token_buckets[key_index].consume(estimated_tokens, now)
+                    if self.health is not None:
+                        self.health.on_dispatch(key_index)
+                    return key_index
+                delay = min(waits.values())
+                if max_wait is not None and delay > max_wait:
+                    raise NoKeyAvailable(f"All API keys are unavailable for the next {delay / 60:.0f} minutes", delay)
+
+            # Sleep in short slices so a stop request is noticed quickly
+            time.sleep(min(delay, 0.5))
+
+    def record_usage(self, key_index, estimated_tokens, actual_tokens):
+        """Correct a key's token budget once the real usage is known"""
+        with self.lock:
+            now = time.monotonic()
+            self.token_buckets[key_index].consume(actual_tokens - estimated_tokens, now)
+
+
+class FairGate:
+    """Shares a number of request slots fairly between jobs.
+
+    When a slot frees up it goes to a waiting job holding the fewest
+    slots, so a small job gets its share at once even while a huge one
+    has plenty of batches queued.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = max(1, capacity)
+        self.condition = threading.Condition()
+        self.held = {}  # Job -> slots it holds
+        self.waiting = {}  # Job -> requests it has waiting
+        self.in_use = 0
+
+    def acquire(self, owner, abort=None):
+        """Block until `owner` may send a request; returns False if `abort()` became true"""
+        with self.condition:
+            self.waiting[owner] = self.waiting.get(owner, 0) + 1
+            try:
+                while True:
+                    if abort is not None and abort():
+                        return False
+                    if self.in_use < self.capacity and self._is_next(owner):
+                        self.in_use += 1
+                        self.held[owner] = self.held.get(owner, 0) + 1
+                        return True
+                    self.condition.wait(0.5)
+            finally:
+                self.waiting[owner] -= 1
+                if not self.waiting[owner]:
+                    del self.waiting[owner]
+
+    def _is_next(self, owner):
+        fewest = min(self.held.get(waiting, 0) for waiting in self.waiting)
+        return self.held.get(owner, 0) == fewest
+
+    def release(self, owner):
+        with self.condition:
+            self.in_use -= 1
+            self.held[owner] -= 1
+            if not self.held[owner]:
+                del self.held[owner]
+            self.condition.notify_all()
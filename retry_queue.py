@@ -0,0 +1,55 @@
+"""Deferred retries: failed batches wait out their backoff in a queue, not on a worker thread"""
+import heapq
+import itertools
+import time
+
+
+class RetryQueue:
+    """Batches waiting for another attempt, ordered by backoff deadline.
+
+    Retries come out of a budget shared by the whole run: on average at
+    most `budget` retries per batch sent (but at least `min_retries`), so a
+    partial outage cannot turn every batch into a string of retries.
+    Retries after a 429 are not charged; the key's breaker paces those.
+    Neither are repairs of the cues missing from a reply that made
+    progress: each one has fewer cues left, so they cannot run away.
+    Only the run loop touches the queue, so it needs no lock.
+    """
+
+    def __init__(self, budget=0.5, min_retries=20):
+        self.budget = budget
+        self.min_retries = min_retries
+        self.heap = []
+        self.order = itertools.count()  # Keeps equal deadlines first in, first out
+        self.batches = 0
+        self.spent = 0
+
+    def __len__(self):
+        return len(self.heap)
+
+    def count_batch(self):
+        self.batches += 1
+
+    def try_spend(self):
+        """Take one retry from the budget if any is left"""
+        if self.spent + 1 > max(self.min_retries, self.batches * self.budget):
+            return False
+        self.spent += 1
+        return True
+
+    def push(self, item, delay=0.0):
+        heapq.heappush(self.heap, (time.time() + delay, next(self.order), item))
+
+    def pop_due(self, now=None):
+        """The next item whose deadline has passed, or None"""
+        now = time.time() if now is None else now
+        if self.heap and self.heap[0][0] <= now:
+            return heapq.heappop(self.heap)[2]
+        return None
+
+    def time_to_next(self, now=None):
+        """Seconds until the earliest deadline, or None if the queue is empty"""
+        if not self.heap:
+            return None
+        now = time.time() if now is None else now
+        return max(0.0, self.heap[0][0] - now)
@@ -0,0 +1,386 @@
+"""Local HTTP translation service: upload SRT files, poll their jobs, download the results.
+
+All jobs share one TranslationEngine, so they draw on the same keys,
+scheduler and translation memory. Uploads wait in a bounded queue, a few
+jobs run at once, and a FairGate hands out request slots so a small file
+is not stuck behind every batch of a huge one. However many jobs run,
+there is at most one request in flight per key:
+
+    python server.py --keys-file keys.txt --port 8765
+
+    curl --data-binary @movie.srt "http://127.0.0.1:8765/jobs?name=movie.srt"
+    curl http://127.0.0.1:8765/jobs/<id>
+    curl -o movie_sinhala.srt http://127.0.0.1:8765/jobs/<id>/result
+
+Endpoints: POST /jobs, GET /jobs, GET /jobs/<id>, GET /jobs/<id>/result,
+DELETE /jobs/<id> (stop or remove a job) and GET /health. Use
+--backend mock to run it without calling the API.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlparse
+
+from cli import add_engine_arguments, create_engine
+from rate_limiter import FairGate
+from translator import TranslationJob
+
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+
+
+class QueueFull(Exception):
+    """Raised when the job queue has no room for another upload"""
+
+
+class InvalidUpload(ValueError):
+    """Raised when an upload cannot be stored as given"""
+
+
+def safe_file_name(name):
+    """An upload name that is safe on disk and in a Content-Disposition header.
+
+    Keeps only the last path component and replaces control characters,
+    quotes and backslashes; empty, '.' and '..' names become upload.srt.
+    """
+    name = os.path.basename((name or '').replace('\\', '/').strip())
+    name = ''.join('_' if ch in '"\'' or unicodedata.category(ch).startswith('C') else ch for ch in name).strip()
+    return name if name.strip('.') else 'upload.srt'
+
+
+def content_disposition(file_name):
+    """An attachment header for file_name, with an ASCII fallback for old clients"""
+    fallback = file_name.encode('ascii', 'replace').decode('ascii').replace('?', '_')
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(file_name, safe='')}"
+
+
+class ServiceJob:
+    """One uploaded file and the state of its translation"""
+
+    def __init__(self, name, input_file, output_file):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.input_file = input_file
+        self.output_file = output_file
+        self.status = 'queued'  # queued, running, completed, failed or stopped
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.job = None  # TranslationJob while running
+        self.summary = None
+        self.error = None
+        self.future = None
+
+    @property
+    def done(self):
+        return self.status in ('completed', 'failed', 'stopped')
+
+    def to_dict(self):
+        job = self.job
+        completed = job.completed_units if job else 0
+        total = job.total_units if job else 0
+        if self.status == 'completed':
+            progress = 100.0
+        else:
+            progress = round(completed / total * 100, 1) if total else 0.0
+        return {
+            'id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'progress': progress,
+            'completed_lines': completed,
+            'total_lines': total,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'summary': self.summary,
+            'error': self.error,
+        }
+
+
+class TranslationService:
+    """Queues uploaded files and translates them with one shared engine"""
+
+    def __init__(self, engine, work_dir, max_queued=20, max_running=4, max_finished=100, log=None):
+        self.engine = engine
+        self.work_dir = work_dir
+        self.max_queued = max(1, max_queued)
+        self.max_finished = max_finished
+        self.log = log or engine.log
+        self.jobs = {}  # Id -> ServiceJob, in upload order
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_running))
+        # Request slots are shared between the running jobs, one per key
+        engine.request_gate = FairGate(len(engine.ready_keys) or 1)
+        os.makedirs(work_dir, exist_ok=True)
+
+    def queued_count(self):
+        return sum(1 for job in self.jobs.values() if job.status == 'queued')
+
+    def submit(self, name, data):
+        """Queue an uploaded SRT file.
+
+        Raises QueueFull when the queue is full, InvalidUpload for a name
+        that cannot be stored and OSError if the file cannot be written.
+        """
+        name = safe_file_name(name)
+        with self.lock:
+            if self.queued_count() >= self.max_queued:
+                raise QueueFull(f"{self.max_queued} jobs are already waiting")
+            job_dir = tempfile.mkdtemp(dir=self.work_dir)
+            stem = os.path.splitext(name)[0]
+            service_job = ServiceJob(
+                name, os.path.join(job_dir, name), os.path.join(job_dir, f"{stem}_sinhala.srt")
+            )
+            try:
+                with open(service_job.input_file, 'wb') as file:
+                    file.write(data)
+            except ValueError as e:  # e.g. a NUL byte in the name
+                shutil.rmtree(job_dir, ignore_errors=True)
+                raise InvalidUpload(f"invalid file name {name!r}") from e
+            except OSError:
+                shutil.rmtree(job_dir, ignore_errors=True)
+                raise
+            self.jobs[service_job.id] = service_job
+            service_job.future = self.executor.submit(self.run_job, service_job)
+            self.prune()
+        self.log(f"📥 [{service_job.id}] Queued {name} ({len(data)} bytes)")
+        return service_job
+
+    def run_job(self, service_job):
+        with self.lock:
+            if service_job.status != 'queued':
+                return  # Stopped while it was waiting
+            service_job.status = 'running'
+            service_job.started = time.time()
+            service_job.job = TranslationJob(
+                self.engine, service_job.input_file, service_job.output_file,
+                log=lambda message: self.log(f"[{service_job.id}] {message}")
+            )
+        try:
+            summary = service_job.job.run()
+        except Exception as e:
+            service_job.error = str(e)
+            status = 'failed'
+            self.log(f"❌ [{service_job.id}] {e}")
+        else:
+            service_job.summary = {k: v for k, v in summary.items() if k != 'status'}
+            status = 'completed' if summary['status'] == 'completed' else 'stopped'
+            if summary['status'] == 'empty':
+                status = 'failed'
+                service_job.error = "no subtitles found"
+        with self.lock:
+            service_job.status = status
+            service_job.finished = time.time()
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self.lock:
+            return [job.to_dict() for job in self.jobs.values()]
+
+    def cancel(self, job_id):
+        """Stop a queued or running job, or remove a finished one; returns False if unknown"""
+        with self.lock:
+            service_job = self.jobs.get(job_id)
+            if service_job is None:
+                return False
+            if service_job.done:
+                del self.jobs[job_id]
+                shutil.rmtree(os.path.dirname(service_job.input_file), ignore_errors=True)
+                return True
+            if service_job.status == 'queued':
+                service_job.future.cancel()
+                service_job.status = 'stopped'
+                service_job.finished = time.time()
+            else:
+                service_job.job.stop()
+        self.log(f"⏹️ [{job_id}] Stopped")
+        return True
+
+    def prune(self):
+        """Forget the oldest finished jobs beyond max_finished (call with the lock held)"""
+        finished = [job for job in self.jobs.values() if job.done]
+        for service_job in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[service_job.id]
+            shutil.rmtree(os.path.dirname(service_job.input_file), ignore_errors=True)
+
+    def health(self):
+        with self.lock:
+            running = sum(1 for job in self.jobs.values() if job.status == 'running')
+            queued = self.queued_count()
+        return {
+            'keys': len(self.engine.ready_keys),
+            'keys_cooling_down': self.engine.key_health.describe(),
+            'running': running,
+            'queued': queued,
+            'max_queued': self.max_queued,
+        }
+
+    def shutdown(self):
+        with self.lock:
+            for service_job in self.jobs.values():
+                if service_job.status == 'queued':
+                    service_job.future.cancel()
+                    service_job.status = 'stopped'
+                elif service_job.status == 'running':
+                    service_job.job.stop()
+        self.executor.shutdown(wait=True)
+        self.engine.evict_memory()
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """Maps the HTTP endpoints onto the server's TranslationService"""
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, message):
+        self.send_json(status, {'error': message})
+
+    def route(self):
+        """(job id or None, trailing part) for /jobs paths, or None for other paths"""
+        parts = [part for part in urlparse(self.path).path.split('/') if part]
+        if not parts or parts[0] != 'jobs' or len(parts) > 3:
+            return None
+        return (parts[1] if len(parts) > 1 else None), (parts[2] if len(parts) > 2 else None)
+
+    def do_GET(self):
+        if urlparse(self.path).path == '/health':
+            return self.send_json(200, self.service.health())
+        route = self.route()
+        if route is None:
+            return self.send_error_json(404, "not found")
+        job_id, action = route
+        if job_id is None:
+            return self.send_json(200, {'jobs': self.service.list()})
+        service_job = self.service.get(job_id)
+        if service_job is None:
+            return self.send_error_json(404, "no such job")
+        if action is None:
+            return self.send_json(200, service_job.to_dict())
+        if action != 'result':
+            return self.send_error_json(404, "not found")
+        if service_job.status != 'completed':
+            return self.send_error_json(409, f"job is {service_job.status}")
+        try:
+            with open(service_job.output_file, 'rb') as file:
+                body = file.read()
+        except OSError:  # Deleted or pruned since the lookup
+            return self.send_error_json(410, "job result is gone")
+        download_name = os.path.basename(service_job.output_file)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-subrip; charset=utf-8')
+        self.send_header('Content-Disposition', content_disposition(download_name))
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        route = self.route()
+        if route != (None, None):
+            return self.send_error_json(404, "not found")
+        try:
+            length = int(self.headers.get('Content-Length', ''))
+        except ValueError:
+            return self.send_error_json(411, "Content-Length required")
+        if length < 0:
+            return self.send_error_json(400, "invalid Content-Length")
+        if length > self.server.max_upload_bytes:
+            self.close_connection = True
+            return self.send_error_json(413, f"upload larger than {self.server.max_upload_bytes} bytes")
+        data = self.rfile.read(length)
+        name = parse_qs(urlparse(self.path).query).get('name', [None])[0]
+        try:
+            service_job = self.service.submit(name, data)
+        except QueueFull as e:
+            return self.send_error_json(503, str(e))
+        except InvalidUpload as e:
+            return self.send_error_json(400, str(e))
+        except OSError as e:
+            self.service.log(f"❌ Could not store upload {name!r}: {e}")
+            return self.send_error_json(500, "could not store the upload")
+        self.send_json(202, service_job.to_dict())
+
+    def do_DELETE(self):
+        route = self.route()
+        if route is None or route[0] is None or route[1] is not None:
+            return self.send_error_json(404, "not found")
+        if not self.service.cancel(route[0]):
+            return self.send_error_json(404, "no such job")
+        self.send_json(200, {'id': route[0], 'deleted': True})
+
+    def log_message(self, format, *args):
+        self.server.service.log(f"🌐 {self.address_string()} {format % args}")
+
+
+def create_server(service, host='127.0.0.1', port=8765, max_upload_bytes=MAX_UPLOAD_BYTES):
+    """An HTTP server for the service (port 0 picks a free port)"""
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.max_upload_bytes = max_upload_bytes
+    return server
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve English to Sinhala subtitle translation over local HTTP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    add_engine_arguments(parser)
+    parser.add_argument('--max-running', type=int, default=4,
+                        help="jobs translated at the same time; they share the keys evenly")
+    parser.add_argument('--max-queued', type=int, default=20,
+                        help="uploads allowed to wait (at least 1); more get HTTP 503")
+    parser.add_argument('--max-upload-mb', type=float, default=MAX_UPLOAD_BYTES / (1024 * 1024))
+    parser.add_argument('--work-dir', default=os.path.join(tempfile.gettempdir(), 'sinhalasubgen-server'),
+                        help="where uploads and results are kept")
+    parser.add_argument('--metrics', action='store_true', help="write a metrics report next to each result")
+    return parser, parser.parse_args(argv)
+
+
+def main(argv=None):
+    parser, args = parse_args(argv)
+
+    engine = create_engine(parser, args)
+    if engine is None:
+        return 1
+    engine.export_metrics_enabled = args.metrics
+
+    service = TranslationService(
+        engine, args.work_dir, max_queued=args.max_queued, max_running=args.max_running
+    )
+    server = create_server(service, args.host, args.port, int(args.max_upload_mb * 1024 * 1024))
+    host, port = server.server_address[:2]
+    print(f"🌐 Serving on http://{host}:{port} with {len(engine.ready_keys)} API key(s)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""Streaming SRT reader and incremental, atomic SRT writer"""
+import os
+import re
+
+# Canonical timing lines need no copy of their text; anything the lenient
+# pattern accepts beyond that is kept verbatim
+CANONICAL_TIMING = re.compile(r'(\d\d):([0-5]\d):([0-5]\d),(\d{3}) --> (\d\d):([0-5]\d):([0-5]\d),(\d{3})')
+TIMING_PATTERN = re.compile(
+    r'(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})\s*-->\s*(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})'
+)
+
+
+def parse_timing(timing):
+    """Parse a timing line into (start_ms, end_ms, raw_timing), or None if invalid"""
+    match = CANONICAL_TIMING.fullmatch(timing)
+    raw_timing = None
+    if match is None:
+        match = TIMING_PATTERN.match(timing)
+        if match is None:
+            return None
+        raw_timing = timing
+    groups = match.groups()
+    h1, m1, s1, h2, m2, s2 = map(int, groups[0:3] + groups[4:7])
+    start = ((h1 * 60 + m1) * 60 + s1) * 1000 + int(groups[3].ljust(3, '0'))
+    end = ((h2 * 60 + m2) * 60 + s2) * 1000 + int(groups[7].ljust(3, '0'))
+    return start, end, raw_timing
+
+
+def format_timestamp(ms):
+    """Milliseconds as an SRT timestamp (HH:MM:SS,mmm)"""
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{ms:03d}"
+
+
+def format_timing(start, end):
+    return f"{format_timestamp(start)} --> {format_timestamp(end)}"
+
+
+class Cue:
+    """One subtitle cue with start/end in integer milliseconds.
+
+    `raw_timing` keeps the original timing line only when it differs from
+    the canonical form (odd spacing, dots, cue settings), so saving writes
+    it back as read. start and end are None when the timing line could
+    not be parsed at all. `translation` is filled in place once the cue
+    is done.
+    """
+
+    __slots__ = ('index', 'start', 'end', 'text', 'translation', 'raw_timing')
+
+    def __init__(self, index, start, end, text, raw_timing=None):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.text = text
+        self.translation = None
+        self.raw_timing = raw_timing
+
+    @property
+    def timestamp(self):
+        """The timing line as written in the file"""
+        return self.raw_timing if self.raw_timing is not None else format_timing(self.start, self.end)
+
+    @property
+    def output_text(self):
+        return self.translation if self.translation is not None else self.text
+
+
+def parse_srt_block(lines):
+    """Turn the lines of one SRT block into a Cue, or None without an index and text"""
+    if len(lines) < 3:
+        return None
+    try:
+        index = int(lines[0].strip())
+    except ValueError:
+        return None
+    timing = parse_timing(lines[1].strip())
+    if timing is None:
+        # Unreadable timing: keep the cue and write its line back as it was
+        timing = None, None, lines[1].strip()
+    start, end, raw_timing = timing
+    return Cue(index, start, end, '\n'.join(lines[2:]), raw_timing)
+
+
+def iter_srt_file(file_path):
+    """Yield Cues one at a time while reading the file line by line"""
+    block = []
+    with open(file_path, 'r', encoding='utf-8-sig') as file:
+        for line in file:
+            line = line.rstrip('\r\n')
+            if line.strip():
+                block.append(line)
+                continue
+            if block:
+                cue = parse_srt_block(block)
+                if cue is not None:
+                    yield cue
+                block = []
+    if block:
+        cue = parse_srt_block(block)
+        if cue is not None:
+            yield cue
+
+
+class IncrementalSrtWriter:
+    """Writes cues to <output>.part as they become ready, then renames atomically.
+
+    The partial file can be inspected while a job runs; the real output path
+    only ever holds a complete file.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = str(file_path)
+        self.part_path = f"{self.file_path}.part"
+        self.file = open(self.part_path, 'w', encoding='utf-8-sig')  # UTF-8 with BOM
+        self.written = 0
+
+    def write(self, cue):
+        """Write a cue with its translation (or its original text if it has none)"""
+        self.file.write(f"{cue.index}\n{cue.timestamp}\n{cue.output_text}\n\n")
+        self.written += 1
+
+    def flush(self):
+        self.file.flush()
+
+    def commit(self):
+        """Finish the file and move it into place"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.part_path, self.file_path)
+
+    def abort(self):
+        """Close without replacing the output; the .part file is left for inspection"""
+        if not self.file.closed:
+            self.file.close()
@@ -0,0 +1,58 @@
+import os
+import sys
+
+import pytest
+
+# The modules live next to app.py rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import MockBackend  # noqa: E402
+from translator import TranslationEngine, TranslationJob  # noqa: E402
+
+
+def write_srt(path, count, text="Line {i} of the story goes on here"):
+    """Write `count` numbered cues two seconds apart"""
+    with open(path, 'w', encoding='utf-8') as file:
+        for i in range(count):
+            seconds = i * 2
+            stamp = f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+            file.write(f"{i + 1}\n{stamp},000 --> {stamp},900\n{text.format(i=i)}\n\n")
+    return str(path)
+
+
+def read_texts(path):
+    """Text lines of an SRT file (neither numbers, timings nor blank lines)"""
+    with open(path, 'r', encoding='utf-8-sig') as file:
+        blocks = file.read().strip().split("\n\n")
+    return ["\n".join(block.split("\n")[2:]) for block in blocks]
+
+
+def untranslated(path):
+    """Lines of an SRT file the mock did not translate"""
+    return [text for text in read_texts(path) if not text.startswith("<b>සිං")]
+
+
+def run_job(engine, input_file, output_file, **kwargs):
+    """Run a TranslationJob; returns (job, summary, log messages)"""
+    messages = []
+    job = TranslationJob(engine, input_file, output_file, log=messages.append, **kwargs)
+    return job, job.run(), messages
+
+
+@pytest.fixture
+def make_engine(tmp_path):
+    """Build a fast, offline engine on a seeded MockBackend"""
+    def make(keys=4, log=None, **mock_options):
+        mock_options.setdefault('latency', 0.0)
+        mock_options.setdefault('jitter', 0.0)
+        api_keys = [f"mock-key-{i + 1}" for i in range(keys)]
+        engine = TranslationEngine(
+            api_keys, backend=MockBackend(keys, **mock_options), log=log,
+            requests_per_minute=100000, key_health_path=tmp_path / "key_health.json"
+        )
+        engine.use_memory = False
+        engine.export_metrics_enabled = False
+        engine.retry_delay = 0.01
+        engine.setup_models()
+        return engine
+    return make
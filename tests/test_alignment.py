@@ -0,0 +1,83 @@
+"""Reusing translations from a previous English/Sinhala pair"""
+from alignment import align_translations, pair_previous
+from conftest import read_texts
+from srt_io import Cue
+from translator import TranslationJob
+
+
+def cues(lines, start=0, step=2000):
+    return [Cue(i + 1, start + i * step, start + i * step + 1500, text) for i, text in enumerate(lines)]
+
+
+def previous(english, sinhala, **timing):
+    return pair_previous(cues(english, **timing), cues(sinhala, **timing))
+
+
+OLD_ENGLISH = ["Good morning.", "Where is the car?", "I parked it outside.", "Let's go.", "Wait for me!"]
+OLD_SINHALA = ["සුබ උදෑසනක්.", "කාර් එක කොහෙද?", "මම ඒක එළියේ නැවැත්තුවා.", "අපි යමු.", "මට ඉන්න!"]
+
+
+def test_retimed_and_renumbered_file_reuses_everything():
+    new = [Cue(i + 10, i * 2000 + 750, i * 2000 + 2250, text) for i, text in enumerate(OLD_ENGLISH)]
+    assert align_translations(previous(OLD_ENGLISH, OLD_SINHALA), new) == dict(enumerate(OLD_SINHALA))
+
+
+def test_inserted_scene_keeps_the_lines_around_it():
+    new = cues(OLD_ENGLISH[:2] + ["A new line.", "Another new one."] + OLD_ENGLISH[2:])
+    aligned = align_translations(previous(OLD_ENGLISH, OLD_SINHALA), new)
+    assert aligned == {0: OLD_SINHALA[0], 1: OLD_SINHALA[1], 4: OLD_SINHALA[2], 5: OLD_SINHALA[3], 6: OLD_SINHALA[4]}
+
+
+def test_edited_line_is_not_reused():
+    new = cues(OLD_ENGLISH[:2] + ["I parked it round the back."] + OLD_ENGLISH[3:])
+    aligned = align_translations(previous(OLD_ENGLISH, OLD_SINHALA), new)
+    assert 2 not in aligned
+    assert sorted(aligned) == [0, 1, 3, 4]
+
+
+def test_moved_repeated_line_takes_the_occurrence_closest_in_time():
+    english = ["Hello.", "Yes.", "Come in.", "Sit down.", "Yes."]
+    sinhala = ["හෙලෝ.", "ඔව් (early)", "ඇතුලට එන්න.", "වාඩි වෙන්න.", "ඔව් (late)"]
+    pairs = previous(english, sinhala, step=2000)
+    # "Come in.", "Sit down.", "Yes." stay in order; "Hello." and the early "Yes." move to the end
+    new = [Cue(1, 4000, 5500, "Come in."), Cue(2, 6000, 7500, "Sit down."), Cue(3, 8000, 9500, "Yes."),
+           Cue(4, 10000, 11500, "Hello."), Cue(5, 2100, 3600, "yes. ")]
+    aligned = align_translations(pairs, new)
+    assert aligned == {0: "ඇතුලට එන්න.", 1: "වාඩි වෙන්න.", 2: "ඔව් (late)", 3: "හෙලෝ.", 4: "ඔව් (early)"}
+
+
+def test_files_of_different_length_are_paired_by_timing():
+    old_english = cues(OLD_ENGLISH)
+    old_sinhala = [cue for cue in cues(OLD_SINHALA) if cue.index != 3]  # One cue lost from the old output
+    pairs = pair_previous(old_english, old_sinhala)
+    assert [(source.text, translated.text) for source, translated in pairs] == [
+        (english, sinhala) for i, (english, sinhala) in enumerate(zip(OLD_ENGLISH, OLD_SINHALA)) if i != 2
+    ]
+
+
+def write_cues(path, lines):
+    with open(path, 'w', encoding='utf-8') as file:
+        for cue in cues(lines):
+            file.write(f"{cue.index}\n{cue.timestamp}\n{cue.text}\n\n")
+    return str(path)
+
+
+def test_job_resends_lines_the_old_run_left_in_english(tmp_path, make_engine):
+    old_sinhala = [f"<b>{text}</b>" for text in OLD_SINHALA]
+    old_sinhala[3] = OLD_ENGLISH[3]  # The old run could not translate this one
+    old_english_file = write_cues(tmp_path / "v1.srt", OLD_ENGLISH)
+    old_sinhala_file = write_cues(tmp_path / "v1_sinhala.srt", old_sinhala)
+    new_english = OLD_ENGLISH[:2] + ["I parked it round the back."] + OLD_ENGLISH[3:]
+    source = write_cues(tmp_path / "v2.srt", new_english)
+    output = str(tmp_path / "v2_sinhala.srt")
+
+    summary = TranslationJob(
+        make_engine(), source, output, log=lambda message: None, previous=(old_english_file, old_sinhala_file)
+    ).run()
+
+    assert summary['status'] == 'completed'
+    texts = read_texts(output)
+    assert texts[0] == old_sinhala[0] and texts[1] == old_sinhala[1] and texts[4] == old_sinhala[4]
+    # The edited line and the one left in English went to the backend
+    assert texts[2] == "<b>සිං I parked it round the back.</b>"
+    assert texts[3] == "<b>සිං Let's go.</b>"
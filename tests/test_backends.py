@@ -0,0 +1,64 @@
+"""Reply parsing and usage accounting shared by every backend"""
+import json
+
+from backends import IncrementalReplyParser, TranslationBackend, parse_response
+from metrics import RunMetrics
+
+
+def test_json_reply():
+    reply = '[{"id": 2, "text": "b"}, {"id": 1, "text": "a"}, {"id": 9, "text": "x"}]'
+    assert parse_response(reply, 2, True) == (['a', 'b'], False)
+
+
+def test_truncated_json_keeps_complete_objects():
+    reply = '[{"id": 1, "text": "a"}, {"id": 2, "text": "b"}, {"id": 3, "te'
+    assert parse_response(reply, 3, True) == (['a', 'b', None], False)
+
+
+def test_json_mode_falls_back_to_markers():
+    assert parse_response("[1] a\n[2] b", 2, True) == (['a', 'b'], True)
+
+
+def test_marker_reply_with_broken_marker():
+    reply = "[1] a\n\n[2] b\nsecond line\n\n3. c\n\n[4] d"
+    translations, fallback = parse_response(reply, 4, False)
+    assert translations == ['a', 'b\nsecond line', None, 'd']
+    assert not fallback
+
+
+def test_streamed_items_are_released_once_complete():
+    reply = '[{"id": 1, "text": "a"}, {"id": 2, "text": "b"}]'
+    released = []
+    parser = IncrementalReplyParser(2, True, lambda index, text: released.append((index, text)))
+    parser.feed(reply[:30])
+    assert released == [(0, 'a')]
+    parser.feed(reply[30:])
+    assert parser.finish() == (['a', 'b'], False)
+    assert released == [(0, 'a'), (1, 'b')]
+
+
+class ReportingBackend(TranslationBackend):
+    """Answers every item and reports (or withholds) its token usage"""
+
+    def __init__(self, prompt_tokens):
+        super().__init__(1)
+        self.prompt_tokens = prompt_tokens
+
+    def generate(self, key_index, prompt, texts, json_mode):
+        reply = json.dumps([{'id': i + 1, 'text': "සිං"} for i in range(len(texts))])
+        return reply, 100, self.prompt_tokens
+
+
+def test_reported_prompt_tokens_are_counted():
+    metrics = RunMetrics()
+    result = ReportingBackend(42).translate_batch(0, ["Hello", "Bye"], metrics=metrics)
+    assert result.prompt_tokens == 42
+    assert metrics.counters['prompt_tokens'] == 42
+    assert 'estimated_prompt_requests' not in metrics.counters
+
+
+def test_prompt_tokens_are_estimated_without_usage():
+    metrics = RunMetrics()
+    ReportingBackend(None).translate_batch(0, ["Hello", "Bye"], metrics=metrics)
+    assert metrics.counters['prompt_tokens'] == metrics.counters['estimated_prompt_tokens'] > 0
+    assert metrics.counters['estimated_prompt_requests'] == 1
@@ -0,0 +1,23 @@
+"""Adaptive batch sizing"""
+from batching import AdaptiveBatchSizer
+
+
+def test_truncated_full_batch_lowers_budget():
+    sizer = AdaptiveBatchSizer(initial_chars=2000)
+    sizer.observe(2000, 1.0, 20, 10)
+    assert sizer.budget == 900
+    assert sizer.ceiling == 2000
+
+
+def test_short_request_does_not_cap_growth():
+    sizer = AdaptiveBatchSizer(initial_chars=2000)
+    sizer.observe(60, 1.0, 2, 1)
+    for _ in range(50):
+        sizer.observe(sizer.budget, 1.0, 15, 15)
+    assert sizer.budget == sizer.max_chars
+
+
+def test_slow_reply_lowers_budget():
+    sizer = AdaptiveBatchSizer(initial_chars=2000, target_latency=10)
+    sizer.observe(2000, 30.0, 20, 20)
+    assert sizer.budget == 1500
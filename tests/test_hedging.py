@@ -0,0 +1,91 @@
+"""Hedged requests and their extra-request budget"""
+import time
+
+from backends import MockBackend
+from conftest import run_job, untranslated, write_srt
+from hedging import HedgePolicy
+from translator import TranslationJob
+
+
+class StragglingBackend(MockBackend):
+    """MockBackend whose first key answers `delay` seconds late"""
+
+    def __init__(self, key_count, delay, **options):
+        super().__init__(key_count, latency=0.0, jitter=0.0, **options)
+        self.delay = delay
+
+    def generate(self, key_index, prompt, texts, json_mode):
+        if key_index == 0:
+            time.sleep(self.delay)
+        return super().generate(key_index, prompt, texts, json_mode)
+
+
+def hedging_engine(make_engine, budget):
+    engine = make_engine(keys=2)
+    engine.backend = StragglingBackend(2, delay=0.5)
+    engine.adaptive_batching = False
+    engine.hedge_requests = True
+    engine.hedge_policy = HedgePolicy(percentile=50, budget=budget, min_samples=1, min_delay=0.05)
+    engine.hedge_policy.record(0.01)
+    return engine
+
+
+def test_policy_waits_for_samples_and_uses_the_percentile():
+    policy = HedgePolicy(percentile=90, min_samples=10, min_delay=0.5)
+    for latency in range(1, 10):
+        policy.record(float(latency))
+    assert policy.delay() is None
+    policy.record(10.0)
+    assert policy.delay() == 10.0
+    policy = HedgePolicy(percentile=50, min_samples=1, min_delay=0.5)
+    policy.record(0.1)
+    assert policy.delay() == 0.5
+
+
+def test_budget_caps_hedges_and_refunds_give_them_back():
+    policy = HedgePolicy(budget=0.1)
+    assert policy.try_spend()  # One hedge is always allowed
+    assert not policy.try_spend()
+    for _ in range(20):
+        policy.count_request()
+    assert policy.try_spend()
+    assert not policy.try_spend()
+    policy.refund()
+    assert policy.try_spend()
+    assert not HedgePolicy(budget=0).try_spend()
+
+
+def test_straggler_is_hedged_on_another_key(tmp_path, make_engine):
+    source = write_srt(tmp_path / "movie.srt", 60)
+    output = str(tmp_path / "movie_sinhala.srt")
+    engine = hedging_engine(make_engine, budget=1.0)
+
+    _, summary, messages = run_job(engine, source, output)
+
+    assert summary['status'] == 'completed'
+    assert untranslated(output) == []
+    assert summary['hedges'] >= 1
+    assert summary['hedge_wins'] >= 1
+    assert summary['hedge_wins'] + summary['hedge_wasted'] == summary['hedges']
+    assert any("Hedge on API key 2 won" in message for message in messages)
+
+
+def test_no_hedges_without_budget(tmp_path, make_engine):
+    source = write_srt(tmp_path / "movie.srt", 30)
+    output = str(tmp_path / "movie_sinhala.srt")
+    engine = hedging_engine(make_engine, budget=0.0)
+
+    _, summary, _ = run_job(engine, source, output)
+
+    assert summary['status'] == 'completed'
+    assert untranslated(output) == []
+    assert summary['hedges'] == 0
+
+
+def test_hedge_is_refunded_when_no_other_key_is_free(tmp_path, make_engine):
+    engine = hedging_engine(make_engine, budget=1.0)
+    engine.key_health.record_quota_error(1, retry_after=60)
+    job = TranslationJob(engine, write_srt(tmp_path / "movie.srt", 5), str(tmp_path / "out.srt"))
+
+    assert job.acquire_hedge_key(0, 100) is None
+    assert engine.hedge_policy.hedges == 0
@@ -0,0 +1,28 @@
+"""Resumable job journal"""
+from journal import TranslationJournal
+
+
+def test_resume_after_torn_line(tmp_path):
+    output = str(tmp_path / "movie_sinhala.srt")
+    journal = TranslationJournal(output)
+    journal.open('hash', resume=False)
+    journal.record([([0], 'a'), ([1, 3], 'b')])
+    journal.close()
+    with open(journal.path, 'a', encoding='utf-8') as file:
+        file.write('{"items": [[[2], "tor')
+
+    resumed = TranslationJournal(output)
+    assert resumed.load('hash') == {0: 'a', 1: 'b', 3: 'b'}
+    resumed.open('hash', resume=True)
+    resumed.record([([2], 'c')])
+    resumed.close()
+
+    assert TranslationJournal(output).load('hash') == {0: 'a', 1: 'b', 2: 'c', 3: 'b'}
+
+
+def test_other_input_is_not_resumed(tmp_path):
+    journal = TranslationJournal(str(tmp_path / "out.srt"))
+    journal.open('old', resume=False)
+    journal.record([([0], 'a')])
+    journal.close()
+    assert journal.load('new') == {}
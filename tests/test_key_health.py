@@ -0,0 +1,54 @@
+"""Daily quota reset time and the per-key circuit breaker"""
+import datetime
+
+import pytest
+
+from key_health import KeyHealthTracker, pacific_offset_zone, quota_day_end
+
+
+def test_fallback_zone_matches_tz_database():
+    zoneinfo = pytest.importorskip('zoneinfo')
+    try:
+        zone = zoneinfo.ZoneInfo('America/Los_Angeles')
+    except zoneinfo.ZoneInfoNotFoundError:
+        pytest.skip("no time zone data installed")
+    # Every hour over two years, including both daylight saving switches
+    start = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc).timestamp()
+    for hour in range(2 * 365 * 24):
+        now = start + hour * 3600
+        assert pacific_offset_zone(now).utcoffset(None) == datetime.datetime.fromtimestamp(now, zone).utcoffset()
+
+
+def test_quota_day_end_is_within_a_day():
+    now = datetime.datetime(2025, 7, 1, 12, tzinfo=datetime.timezone.utc).timestamp()
+    # Noon UTC is 5:00 in California in summer, so the reset is 19 hours away
+    assert quota_day_end(now) - now == 19 * 3600
+
+
+def test_stale_success_does_not_close_the_breaker():
+    tracker = KeyHealthTracker(['key-a', 'key-b'], path=None)
+    # Two requests in flight when the first 429 arrives
+    tracker.on_dispatch(0)
+    tracker.on_dispatch(0)
+    tracker.record_quota_error(0, retry_after=60)
+    tracker.record_success(0)
+    assert tracker.keys[0].state == 'open'
+    assert tracker.wait_time(0) > 50
+
+    tracker.on_dispatch(1)
+    tracker.on_dispatch(1)
+    tracker.record_quota_error(1, daily=True)
+    tracker.record_success(1)
+    assert tracker.keys[1].state == 'open'
+    assert tracker.wait_time(1) > 0
+
+
+def test_probe_success_closes_the_breaker():
+    tracker = KeyHealthTracker(['key-a'], path=None)
+    tracker.record_quota_error(0, retry_after=0)
+    assert tracker.wait_time(0) == 0
+    tracker.on_dispatch(0)
+    assert tracker.wait_time(0) > 0  # One probe at a time
+    tracker.record_success(0)
+    assert tracker.keys[0].state == 'closed'
+    assert tracker.wait_time(0) == 0
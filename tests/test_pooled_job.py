@@ -0,0 +1,89 @@
+"""Several files translated as one pool of cues"""
+import threading
+import time
+
+from backends import MockBackend
+from conftest import read_texts, untranslated, write_srt
+from translator import PooledTranslationJob
+
+
+class RecordingBackend(MockBackend):
+    """MockBackend that remembers every line it was asked to translate.
+
+    Batches with a line containing `slow_text` answer 0.2 seconds late.
+    """
+
+    def __init__(self, key_count, slow_text=None, **options):
+        super().__init__(key_count, latency=0.0, jitter=0.0, **options)
+        self.slow_text = slow_text
+        self.sent = []
+        self.sent_lock = threading.Lock()
+
+    def generate(self, key_index, prompt, texts, json_mode):
+        with self.sent_lock:
+            self.sent.extend(texts)
+        if self.slow_text is not None and any(self.slow_text in text for text in texts):
+            time.sleep(0.2)
+        return super().generate(key_index, prompt, texts, json_mode)
+
+
+def write_episode(path, number, count=40):
+    """An episode whose first ten lines are the same opening as every other episode"""
+    write_srt(path, count, text=f"Episode {number} line {{i}}")
+    with open(path, encoding='utf-8') as file:
+        blocks = file.read().strip().split("\n\n")
+    for i in range(10):
+        blocks[i] = "\n".join(blocks[i].split("\n")[:2] + [f"Opening song, verse {i}"])
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write("\n\n".join(blocks) + "\n\n")
+    return str(path)
+
+
+def run_pool(engine, pairs):
+    done = []
+    job = PooledTranslationJob(
+        engine, pairs, log=lambda message: None, on_file_done=lambda task: done.append(task.input_file)
+    )
+    return job.run(), done
+
+
+def test_lines_shared_between_files_are_sent_once(tmp_path, make_engine):
+    engine = make_engine()
+    engine.adaptive_batching = False
+    # The first episode is the last to finish, but it is still committed first
+    engine.backend = RecordingBackend(4, slow_text="Episode 0")
+    pairs = [(write_episode(tmp_path / f"e{n}.srt", n), str(tmp_path / f"e{n}_sinhala.srt")) for n in range(3)]
+
+    summary, done = run_pool(engine, pairs)
+
+    assert summary['status'] == 'completed'
+    assert summary['duplicate_cues'] == 20
+    assert sorted(engine.backend.sent) == sorted(set(engine.backend.sent))
+    assert len(engine.backend.sent) == 3 * 40 - 20
+    assert done == [source for source, _ in pairs]  # Committed in input order
+    for n, (source, output) in enumerate(pairs):
+        texts = read_texts(output)
+        assert texts[0] == "<b>සිං Opening song, verse 0</b>"
+        assert texts[-1] == f"<b>සිං Episode {n} line 39</b>"
+        assert untranslated(output) == []
+    assert [entry['status'] for entry in summary['files']] == ['completed'] * 3
+
+
+def test_a_bad_file_fails_on_its_own(tmp_path, make_engine):
+    engine = make_engine()
+    empty = tmp_path / "empty.srt"
+    empty.write_text("", encoding='utf-8')
+    pairs = [
+        (write_srt(tmp_path / "a.srt", 30), str(tmp_path / "a_sinhala.srt")),
+        (str(tmp_path / "missing.srt"), str(tmp_path / "missing_sinhala.srt")),
+        (str(empty), str(tmp_path / "empty_sinhala.srt")),
+        (write_srt(tmp_path / "b.srt", 30), str(tmp_path / "b_sinhala.srt")),
+    ]
+
+    summary, done = run_pool(engine, pairs)
+
+    statuses = {entry['input']: entry['status'] for entry in summary['files']}
+    assert statuses == {pairs[0][0]: 'completed', pairs[1][0]: 'failed', pairs[2][0]: 'empty', pairs[3][0]: 'completed'}
+    assert done == [pairs[0][0], pairs[3][0]]
+    assert untranslated(pairs[0][1]) == [] and untranslated(pairs[3][1]) == []
+    assert not (tmp_path / "missing_sinhala.srt").exists()
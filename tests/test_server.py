@@ -0,0 +1,207 @@
+"""The local HTTP service, run on a free port against the seeded MockBackend"""
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import quote
+
+import pytest
+
+from conftest import read_texts, write_srt
+from rate_limiter import FairGate
+from server import TranslationService, create_server
+
+
+@pytest.fixture
+def make_server(tmp_path, make_engine):
+    """Start a server on a free port; returns a request(method, path, data) helper"""
+    servers = []
+
+    def start(max_queued=20, max_running=2, max_upload_bytes=1_000_000, **mock_options):
+        engine = make_engine(**mock_options)
+        engine.adaptive_batching = False
+        service = TranslationService(engine, str(tmp_path / "work"), max_queued=max_queued, max_running=max_running)
+        server = create_server(service, port=0, max_upload_bytes=max_upload_bytes)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append((server, service))
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+
+        def request(method, path, data=None, with_headers=False):
+            try:
+                with urllib.request.urlopen(urllib.request.Request(base + path, data=data, method=method)) as reply:
+                    status, body, headers = reply.status, reply.read(), reply.headers
+            except urllib.error.HTTPError as e:
+                status, body, headers = e.code, e.read(), e.headers
+            return (status, body, headers) if with_headers else (status, body)
+        return request
+
+    yield start
+    for server, service in servers:
+        server.shutdown()
+        server.server_close()
+        service.shutdown()
+
+
+def upload(request, path, name):
+    with open(path, 'rb') as file:
+        status, body = request('POST', f"/jobs?name={name}", file.read())
+    return status, json.loads(body)
+
+
+def wait_until_done(request, job_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = json.loads(request('GET', f"/jobs/{job_id}")[1])
+        if job['status'] not in ('queued', 'running'):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_upload_poll_and_download(tmp_path, make_server):
+    request = make_server()
+    source = write_srt(tmp_path / "movie.srt", 90)
+
+    status, job = upload(request, source, "movie.srt")
+    assert status == 202
+    assert job['status'] in ('queued', 'running')
+
+    job = wait_until_done(request, job['id'])
+    assert job['status'] == 'completed'
+    assert job['progress'] == 100.0
+
+    status, body = request('GET', f"/jobs/{job['id']}/result")
+    assert status == 200
+    result = tmp_path / "result.srt"
+    result.write_bytes(body)
+    texts = read_texts(result)
+    assert len(texts) == 90
+    assert all(text.startswith("<b>සිං") for text in texts)
+
+    listed = json.loads(request('GET', "/jobs")[1])['jobs']
+    assert [entry['id'] for entry in listed] == [job['id']]
+    assert request('DELETE', f"/jobs/{job['id']}")[0] == 200
+    assert request('GET', f"/jobs/{job['id']}")[0] == 404
+
+
+def test_result_removed_under_the_handler(tmp_path, make_server):
+    request = make_server()
+    source = write_srt(tmp_path / "movie.srt", 10)
+    job = upload(request, source, "movie.srt")[1]
+    wait_until_done(request, job['id'])
+
+    # As if a DELETE or prune() ran between the lookup and the read
+    for result in (tmp_path / "work").glob("*/movie_sinhala.srt"):
+        result.unlink()
+    assert request('GET', f"/jobs/{job['id']}/result")[0] == 410
+
+
+def test_rejected_requests(tmp_path, make_server):
+    request = make_server(max_upload_bytes=1000)
+    source = write_srt(tmp_path / "movie.srt", 200)
+
+    assert upload(request, source, "movie.srt")[0] == 413
+    assert request('GET', "/jobs/unknown")[0] == 404
+    assert request('GET', "/elsewhere")[0] == 404
+
+
+def test_unsafe_names_are_replaced(tmp_path, make_server):
+    request = make_server()
+    source = write_srt(tmp_path / "movie.srt", 5)
+
+    for name in ("..", ".", "", "%2E%2E"):
+        status, job = upload(request, source, name)
+        assert status == 202
+        assert job['name'] == "upload.srt"
+        assert wait_until_done(request, job['id'])['status'] == 'completed'
+    assert upload(request, source, "bad%00name.srt")[1]['name'] == "bad_name.srt"
+
+
+def test_names_cannot_inject_headers(tmp_path, make_server):
+    request = make_server()
+    source = write_srt(tmp_path / "movie.srt", 5)
+
+    for name, stored in (("evil%0d%0aX-Injected:%20yes%0d%0a.srt", "evil__X-Injected: yes__.srt"),
+                         ('say%22hi%22.srt', "say_hi_.srt"), ('C:%5Cclips%5Cone.srt', "one.srt"),
+                         ("සිංහල.srt", "සිංහල.srt")):
+        job = upload(request, source, quote(name, safe='%'))[1]
+        assert job['name'] == stored
+        wait_until_done(request, job['id'])
+        status, _, headers = request('GET', f"/jobs/{job['id']}/result", with_headers=True)
+        assert status == 200
+        assert 'X-Injected' not in headers
+        disposition = headers['Content-Disposition']
+        assert disposition.isascii()
+        stem = stored[:-len(".srt")]
+        assert disposition.endswith(f"filename*=UTF-8''{quote(stem + '_sinhala.srt', safe='')}")
+
+
+def test_full_queue_is_refused(tmp_path, make_server):
+    request = make_server(max_queued=1, max_running=1, latency=0.05)
+    source = write_srt(tmp_path / "movie.srt", 300)
+
+    running = upload(request, source, "a.srt")[1]
+    while json.loads(request('GET', f"/jobs/{running['id']}")[1])['status'] == 'queued':
+        time.sleep(0.01)
+    status, queued = upload(request, source, "b.srt")
+    assert status == 202
+    assert upload(request, source, "c.srt")[0] == 503
+    assert json.loads(request('GET', "/health")[1])['queued'] == 1
+
+    # A result is only there once the job has completed
+    assert request('GET', f"/jobs/{queued['id']}/result")[0] == 409
+    assert request('DELETE', f"/jobs/{queued['id']}")[0] == 200
+    assert json.loads(request('GET', f"/jobs/{queued['id']}")[1])['status'] == 'stopped'
+    request('DELETE', f"/jobs/{running['id']}")
+
+
+def test_small_job_is_not_stuck_behind_a_large_one(tmp_path, make_server):
+    request = make_server(latency=0.02)
+    large = write_srt(tmp_path / "large.srt", 1500)
+    small = write_srt(tmp_path / "small.srt", 30)
+
+    large_job = upload(request, large, "large.srt")[1]
+    time.sleep(0.1)
+    small_job = upload(request, small, "small.srt")[1]
+
+    small_done = wait_until_done(request, small_job['id'])
+    large_state = json.loads(request('GET', f"/jobs/{large_job['id']}")[1])
+    assert small_done['status'] == 'completed'
+    assert large_state['status'] == 'running'
+    assert wait_until_done(request, large_job['id'])['status'] == 'completed'
+
+
+def test_fair_gate_hands_a_free_slot_to_the_job_holding_fewest():
+    gate = FairGate(2)
+    large, small = object(), object()
+    assert gate.acquire(large) and gate.acquire(large)
+
+    granted = []
+
+    def wait_for_slot(owner, name):
+        gate.acquire(owner)
+        granted.append(name)
+
+    threads = [
+        threading.Thread(target=wait_for_slot, args=(large, 'large'), daemon=True),
+        threading.Thread(target=wait_for_slot, args=(small, 'small'), daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    assert granted == []
+
+    gate.release(large)
+    time.sleep(0.1)
+    assert granted == ['small']
+
+    gate.release(large)
+    threads[0].join(timeout=2)
+    assert granted == ['small', 'large']
+
+
+def test_fair_gate_gives_up_when_aborted():
+    gate = FairGate(1)
+    gate.acquire('a')
+    assert gate.acquire('b', abort=lambda: True) is False
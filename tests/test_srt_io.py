@@ -0,0 +1,31 @@
+"""Reading and writing SRT files"""
+from srt_io import IncrementalSrtWriter, iter_srt_file
+
+SAMPLE = (
+    "1\n00:00:01,000 --> 00:00:02,500\nHello there.\n\n"
+    "2\n00:00:05:000 --> 00:00:06:000\nBroken timing.\n\n"
+    "3\n00:00:07.25 --> 00:00:08.5  X1:10\nOdd but readable.\nSecond line.\n\n"
+)
+
+
+def test_cues_are_written_back_as_read(tmp_path):
+    source = tmp_path / "in.srt"
+    source.write_text(SAMPLE, encoding='utf-8')
+
+    cues = list(iter_srt_file(source))
+    assert [cue.index for cue in cues] == [1, 2, 3]
+    assert (cues[0].start, cues[0].end) == (1000, 2500)
+    assert (cues[1].start, cues[1].end) == (None, None)
+    assert (cues[2].start, cues[2].end) == (7250, 8500)
+
+    writer = IncrementalSrtWriter(tmp_path / "out.srt")
+    for cue in cues:
+        writer.write(cue)
+    writer.commit()
+    assert (tmp_path / "out.srt").read_text(encoding='utf-8-sig') == SAMPLE
+
+
+def test_blocks_without_index_or_text_are_skipped(tmp_path):
+    source = tmp_path / "in.srt"
+    source.write_text("x\n00:00:01,000 --> 00:00:02,000\nNo index.\n\n2\n00:00:03,000 --> 00:00:04,000\n\n", encoding='utf-8')
+    assert list(iter_srt_file(source)) == []
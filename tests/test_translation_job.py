@@ -0,0 +1,136 @@
+"""End-to-end runs of TranslationJob against the seeded MockBackend"""
+import re
+
+import pytest
+
+from conftest import read_texts, run_job, untranslated, write_srt
+from rate_limiter import NoKeyAvailable
+from translator import TranslationJob
+
+
+@pytest.mark.parametrize('json_mode', [True, False])
+def test_clean_run_translates_every_cue(tmp_path, make_engine, json_mode):
+    source = write_srt(tmp_path / "movie.srt", 120)
+    output = str(tmp_path / "movie_sinhala.srt")
+    engine = make_engine()
+    engine.json_mode = json_mode
+
+    job, summary, _ = run_job(engine, source, output)
+
+    assert summary['status'] == 'completed'
+    assert summary['cues'] == 120
+    assert untranslated(output) == []
+    assert not (tmp_path / "movie_sinhala.srt.journal.jsonl").exists()
+    assert {'parse', 'dedup', 'batching', 'prompt_build', 'network', 'file_write'} <= set(job.metrics.stage_seconds)
+
+
+def test_rate_limited_key_is_routed_around(tmp_path, make_engine):
+    source = write_srt(tmp_path / "movie.srt", 200)
+    output = str(tmp_path / "movie_sinhala.srt")
+    engine = make_engine(quota_error_rate={0: 1.0})
+
+    job, summary, messages = run_job(engine, source, output)
+
+    assert summary['status'] == 'completed'
+    assert untranslated(output) == []
+    # The 429 opened key 1's breaker, so every later batch went to the others
+    assert job.metrics.key_outcomes['1']['rate_limited'] >= 1
+    assert job.metrics.key_outcomes['1']['success'] == 0
+    assert any("Rate limit hit on API key 1" in message for message in messages)
+
+
+@pytest.mark.parametrize('json_mode', [True, False])
+def test_truncated_replies_are_repaired(tmp_path, make_engine, json_mode):
+    source = write_srt(tmp_path / "movie.srt", 300)
+    output = str(tmp_path / "movie_sinhala.srt")
+    engine = make_engine(truncate_rate=0.3)
+    engine.json_mode = json_mode
+
+    job, summary, _ = run_job(engine, source, output)
+
+    assert summary['status'] == 'completed'
+    assert len(untranslated(output)) <= 3
+    # Complete items of a cut-off reply are kept and only the rest is re-requested
+    assert summary['retry_reasons'].get('missing items', 0) > 0
+
+
+def test_malformed_replies_are_retried(tmp_path, make_engine):
+    source = write_srt(tmp_path / "movie.srt", 300)
+    output = str(tmp_path / "movie_sinhala.srt")
+    engine = make_engine(malformed_rate=0.2)
+    engine.json_mode = False
+
+    job, summary, _ = run_job(engine, source, output)
+
+    assert summary['status'] == 'completed'
+    assert untranslated(output) == []
+
+
+def test_english_replies_do_not_shrink_batches(tmp_path, make_engine):
+    source = write_srt(tmp_path / "movie.srt", 3000)
+    output = str(tmp_path / "movie_sinhala.srt")
+    engine = make_engine(english_rate=0.02)
+
+    job, summary, _ = run_job(engine, source, output)
+
+    assert summary['status'] == 'completed'
+    assert untranslated(output) == []
+    # Untranslated lines are repaired without being taken for truncation
+    assert summary['batches'] < 3000 / engine.batch_size
+
+
+def test_stopped_job_resumes_from_journal(tmp_path, make_engine):
+    source = write_srt(tmp_path / "movie.srt", 400)
+    output = str(tmp_path / "movie_sinhala.srt")
+    engine = make_engine(latency=0.01)
+    engine.adaptive_batching = False
+
+    def stop_early(**state):
+        if job.completed_units >= 100:
+            job.stop()
+
+    job = TranslationJob(engine, source, output, on_progress=stop_early)
+    assert job.run()['status'] == 'stopped'
+    journal = tmp_path / "movie_sinhala.srt.journal.jsonl"
+    assert journal.exists()
+
+    # Simulate a crash in the middle of writing a record
+    with open(journal, 'a', encoding='utf-8') as file:
+        file.write('{"items": [[[399], "torn')
+
+    second, summary, messages = run_job(make_engine(), source, output)
+    restored = [message for message in messages if message.startswith("⏯️ Resuming job")]
+    assert restored
+    assert summary['status'] == 'completed'
+    assert summary['batches'] < 400 / engine.batch_size
+    assert untranslated(output) == []
+    assert len(read_texts(output)) == 400
+
+
+@pytest.mark.parametrize('adaptive', [True, False])
+def test_duplicates_report_saved_calls(tmp_path, make_engine, adaptive):
+    # 300 cues but only 30 distinct lines
+    source = write_srt(tmp_path / "movie.srt", 300, text="Line {i} again")
+    with open(source, encoding='utf-8') as file:
+        content = file.read()
+    content = re.sub(r"Line (\d+) again", lambda match: f"Line {int(match.group(1)) % 30} again", content)
+    with open(source, 'w', encoding='utf-8') as file:
+        file.write(content)
+    engine = make_engine()
+    engine.adaptive_batching = adaptive
+
+    _, summary, messages = run_job(engine, source, str(tmp_path / "movie_sinhala.srt"))
+
+    assert summary['duplicate_cues'] == 270
+    assert summary['saved_calls_estimated'] is adaptive
+    assert summary['saved_calls'] == 18
+    assert any("Deduplication saved" in message for message in messages)
+
+
+def test_no_ready_keys_fails_the_job(tmp_path, make_engine):
+    source = write_srt(tmp_path / "movie.srt", 10)
+    engine = make_engine()
+    engine.ready_keys = []
+
+    with pytest.raises(NoKeyAvailable):
+        run_job(engine, source, str(tmp_path / "movie_sinhala.srt"))
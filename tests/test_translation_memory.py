@@ -0,0 +1,22 @@
+"""Translation memory lookups and their effect on eviction order"""
+from translation_memory import TranslationMemory
+
+
+def last_used(memory):
+    return dict(memory.conn.execute("SELECT source, last_used FROM memory"))
+
+
+def test_lookup_without_touch_keeps_lru_order(tmp_path):
+    memory = TranslationMemory(tmp_path / "memory.sqlite3")
+    memory.store_many([("Hello", "ආයුබෝවන්"), ("Thank you", "ස්තූතියි")])
+    with memory.conn:
+        memory.conn.execute("UPDATE memory SET last_used = 0")
+    before = last_used(memory)
+
+    assert memory.lookup_many(["  HELLO "], touch=False) == {"hello": "ආයුබෝවන්"}
+    assert last_used(memory) == before
+
+    memory.lookup_many(["hello"])
+    after = last_used(memory)
+    assert after["hello"] > before["hello"]
+    assert after["thank you"] == before["thank you"]
@@ -0,0 +1,93 @@
+"""Persistent English -> Sinhala translation memory backed by SQLite"""
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_MEMORY_PATH = Path.home() / '.sinhalasubgen' / 'translation_memory.sqlite3'
+
+# SQLite's default limit on host parameters per statement is 999
+LOOKUP_CHUNK = 500
+
+
+def normalize_text(text):
+    """Normalize subtitle text for matching: collapse whitespace and ignore case"""
+    return re.sub(r'\s+', ' ', text).strip().casefold()
+
+
+class TranslationMemory:
+    """Size-capped cache of past translations with LRU and age eviction"""
+
+    def __init__(self, path=DEFAULT_MEMORY_PATH, max_entries=200000, max_age_days=180):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400
+        self.lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS memory ("
+                "source TEXT PRIMARY KEY, translation TEXT NOT NULL, "
+                "created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS memory_last_used ON memory (last_used)")
+        self.evict()
+
+    def lookup_many(self, texts, touch=True):
+        """Return {normalized text: translation} for every text found in memory.
+
+        With touch=False last_used is left as it is, so a dry run does not
+        reorder what eviction drops first.
+        """
+        keys = list({normalize_text(text) for text in texts})
+        found = {}
+        with self.lock:
+            for i in range(0, len(keys), LOOKUP_CHUNK):
+                chunk = keys[i:i + LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT source, translation FROM memory WHERE source IN ({placeholders})", chunk
+                ).fetchall()
+                found.update(rows)
+
+            if found and touch:
+                now = time.time()
+                with self.conn:
+                    self.conn.executemany(
+                        "UPDATE memory SET last_used = ? WHERE source = ?",
+                        [(now, key) for key in found]
+                    )
+        return found
+
+    def store_many(self, pairs):
+        """Remember (source text, translation) pairs"""
+        now = time.time()
+        rows = [(normalize_text(source), translation, now, now) for source, translation in pairs if translation]
+        if not rows:
+            return
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO memory (source, translation, created, last_used) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(source) DO UPDATE SET translation = excluded.translation, last_used = excluded.last_used",
+                rows
+            )
+
+    def evict(self):
+        """Drop entries older than max_age, then least recently used ones above max_entries"""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM memory WHERE created < ?", (time.time() - self.max_age,))
+            count = self.conn.execute("SELECT COUNT(*) FROM memory").fetchone()[0]
+            if count > self.max_entries:
+                self.conn.execute(
+                    "DELETE FROM memory WHERE source IN "
+                    "(SELECT source FROM memory ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+
+    def close(self):
+        self.evict()
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,974 @@
+"""Tk-free translation pipeline shared by the GUI and the command line.
+
+A TranslationEngine holds what every job shares (backend, key scheduler,
+translation memory, settings); a TranslationJob translates one file. Several
+jobs can run at once against one engine and draw on the same key budget.
+"""
+import math
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from alignment import align_translations, pair_previous
+from backends import create_backend, QuotaExceededError
+from batching import AdaptiveBatchSizer, deduplicate_cues, iter_batches
+from hedging import HedgePolicy
+from journal import TranslationJournal, hash_file
+from key_health import DEFAULT_HEALTH_PATH, KeyHealthTracker
+from metrics import RunMetrics
+from rate_limiter import KeyScheduler, NoKeyAvailable
+from retry_queue import RetryQueue
+from srt_io import iter_srt_file, IncrementalSrtWriter
+from translation_memory import TranslationMemory, normalize_text
+
+
+STREAM_POLL_INTERVAL = 0.2  # Seconds between writes of streamed cues
+
+
+def ignore(*args, **kwargs):
+    pass
+
+
+class TranslationEngine:
+    """Backend, key budget, translation memory and settings shared by all jobs.
+
+    `log` is called with one message string and may be called from any
+    thread. Settings are plain attributes; change them between runs only.
+    """
+
+    def __init__(self, api_keys, backend=None, log=None, requests_per_minute=10,
+                 tokens_per_minute=1000000, key_health_path=DEFAULT_HEALTH_PATH, requests_per_day=None):
+        self.api_keys = api_keys
+        self.log = log or ignore
+
+        # Translation backend (SINHALASUBGEN_BACKEND=mock runs fully offline)
+        if backend is None:
+            backend = create_backend(os.environ.get('SINHALASUBGEN_BACKEND', 'gemini'), api_keys)
+        self.backend = backend
+        self.ready_keys = []
+
+        # Per-key circuit breakers, remembered between runs
+        self.key_health = KeyHealthTracker(api_keys, path=key_health_path, requests_per_day=requests_per_day)
+
+        # Per-key quota budgets (free tier defaults for Gemini Flash)
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.scheduler = KeyScheduler(len(api_keys), requests_per_minute, tokens_per_minute, self.key_health)
+
+        # Settings
+        self.batch_size = 15
+        self.max_retries = 3
+        self.retry_delay = 1
+        self.retry_budget = 0.5  # Retries per batch over a whole job, not counting 429s
+        self.max_in_flight = len(api_keys)  # Per job: one concurrent request per API key
+        self.auto_rotate = True
+        self.use_memory = True
+        self.adaptive_batching = True
+        self.json_mode = True
+        self.export_metrics_enabled = True
+        self.profile_run = False
+        self.max_key_wait = 900  # Fail the job if every key is out for longer (seconds)
+        self.hedge_requests = False
+        self.streaming = False  # Stream replies and write each cue as soon as it arrives
+        self.request_gate = None  # A FairGate when several jobs should share the keys evenly
+        self.hedge_policy = HedgePolicy()  # Shared so every job learns from the same latencies
+
+        self.translation_memory = None  # Opened on first use
+        self.memory_lock = threading.Lock()
+
+    def setup_models(self):
+        """Check every API key with the backend (clients are created on first use)"""
+        for i in range(len(self.api_keys)):
+            try:
+                self.backend.setup_key(i)
+                self.ready_keys.append(i)
+                self.log(f"✅ API Key {i+1} ready")
+            except Exception as e:
+                self.log(f"❌ Failed to initialize API Key {i+1}: {str(e)}")
+
+    def set_rate_limits(self, requests_per_minute):
+        """Rebuild the key budgets if the per-key request limit changed"""
+        if requests_per_minute != self.requests_per_minute:
+            self.requests_per_minute = max(1, requests_per_minute)
+            self.scheduler = KeyScheduler(
+                len(self.api_keys), self.requests_per_minute, self.tokens_per_minute, self.key_health
+            )
+
+    def parse_srt_file(self, file_path):
+        """Parse SRT subtitle file (streams the file rather than reading it whole)"""
+        return list(iter_srt_file(file_path))
+
+    def save_srt_file(self, subtitles, file_path):
+        """Save translated subtitles to SRT file with proper UTF-8 encoding"""
+        writer = IncrementalSrtWriter(file_path)
+        try:
+            for subtitle in subtitles:
+                writer.write(subtitle)
+            writer.commit()
+            self.log(f"💾 File saved with UTF-8 encoding: {os.path.basename(file_path)}")
+        except Exception as e:
+            writer.abort()
+            self.log(f"❌ Error saving file: {str(e)}")
+            raise
+
+    def is_rate_limit_error(self, error):
+        """True if an API error is a rate limit / quota error (HTTP 429)"""
+        return isinstance(error, QuotaExceededError) or getattr(error, 'code', None) == 429
+
+    def is_untranslated(self, source, translation):
+        """True if a translation is missing, empty or still English"""
+        if not translation or not translation.strip():
+            return True
+        # Lines without letters ("♪", "...", numbers) may legitimately stay as they are
+        if not re.search(r'[A-Za-z]', source):
+            return False
+        stripped = re.sub(r'<[^>]+>', '', translation)
+        return not re.search(r'[\u0D80-\u0DFF]', stripped)
+
+    def get_translation_memory(self):
+        """Open the on-disk translation memory if it is enabled"""
+        if not self.use_memory:
+            return None
+        with self.memory_lock:
+            if self.translation_memory is None:
+                try:
+                    self.translation_memory = TranslationMemory()
+                except Exception as e:
+                    self.log(f"⚠️ Translation memory unavailable: {str(e)}")
+                    self.use_memory = False
+            return self.translation_memory
+
+    def remember_translations(self, texts, translations):
+        """Store successful translations of a batch's source lines in the translation memory"""
+        memory = self.get_translation_memory()
+        if memory is None:
+            return
+        pairs = [
+            (source, text)
+            for source, text in zip(texts, translations)
+            if text is not None
+        ]
+        try:
+            memory.store_many(pairs)
+        except Exception as e:
+            self.log(f"⚠️ Could not update translation memory: {str(e)}")
+
+    def save_key_health(self):
+        """Persist the key breakers and daily usage for the next run"""
+        try:
+            self.key_health.save()
+        except OSError as e:
+            self.log(f"⚠️ Could not save key health: {str(e)}")
+
+    def evict_memory(self):
+        """Apply the translation memory's age and size limits"""
+        if self.translation_memory is not None:
+            self.translation_memory.evict()
+
+
+class FileTask:
+    """One input/output pair of a job and its per-file state"""
+
+    def __init__(self, input_file, output_file, previous=None):
+        self.input_file = input_file
+        self.output_file = output_file
+        self.previous = previous  # (English, Sinhala) files of an earlier version to reuse translations from
+        self.subtitles = None
+        self.finished = None  # One flag per cue: translation (or English fallback) is final
+        self.journal = None
+        self.writer = None
+        self.output_ready = 0
+        self.pending_positions = []
+        self.cache_hits = 0
+        self.reused_cues = 0
+        self.total_cues = 0  # Cues that still had to be translated
+        self.completed_cues = 0
+        self.summary = None  # Set once the file is finished, failed or stopped
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.abort()
+        if self.journal is not None:
+            self.journal.close()
+
+
+class PendingBatch:
+    """A batch that is in flight or waiting to be retried, with the translations so far"""
+
+    def __init__(self, batch_num, batch_units, texts):
+        self.batch_num = batch_num
+        self.batch_units = batch_units
+        self.texts = texts  # Source lines, kept here as the cues are released once written
+        self.translations = [None] * len(texts)
+        self.delivered = bytearray(len(texts))  # Items already written out (streamed ones early)
+        self.parts = 1  # Parts not yet settled; a split adds one
+
+
+class BatchPart:
+    """Items of a batch that are sent together, with their attempt counts"""
+
+    def __init__(self, batch, todo):
+        self.batch = batch
+        self.todo = todo
+        self.failed_attempts = 0
+        self.rate_limited = 0
+        self.retry_reason = None  # Why the last attempt needs another, None if it does not
+
+
+class TranslationJob:
+    """Translates one SRT file with a TranslationEngine.
+
+    `on_progress` receives keyword updates (status, progress, speed,
+    api_status) from worker threads; completed_units and total_units hold
+    the same progress as numbers. run() returns a summary dict whose
+    'status' is 'completed', 'stopped' or 'empty', and raises on errors.
+
+    `previous` is an optional (English, Sinhala) pair of files from an
+    earlier version of the input; lines it already has a translation for
+    are reused and only new or edited lines are sent to the API.
+    """
+
+    def __init__(self, engine, input_file, output_file, log=None, on_progress=None, previous=None):
+        self.engine = engine
+        self.files = [FileTask(input_file, output_file, previous)]
+        self.metrics_path = output_file
+        self.log = log or engine.log
+        self.on_progress = on_progress or ignore
+        self.on_file_done = ignore
+        self.active = True
+        self.metrics = None  # RunMetrics of this run
+        self.batch_sizer = None  # Set when adaptive batching is on
+        self.completed_batches = 0
+        self.completed_units = 0
+        self.total_units = 0
+        self.request_pool = None  # Runs the requests themselves when hedging is on
+        self.streamed = queue.SimpleQueue()  # (batch, index, translation) released by streamed replies
+
+    @property
+    def input_file(self):
+        return self.files[0].input_file
+
+    @property
+    def output_file(self):
+        return self.files[0].output_file
+
+    def stop(self):
+        self.active = False
+
+    def acquire_key(self, estimated_tokens):
+        """Wait for the key with the most quota headroom, returns its index (None if stopped).
+
+        Raises NoKeyAvailable if every key is out of rotation for longer
+        than engine.max_key_wait.
+        """
+        engine = self.engine
+        allowed_keys = engine.ready_keys if engine.auto_rotate else engine.ready_keys[:1]
+        return engine.scheduler.acquire(
+            estimated_tokens,
+            allowed_keys=allowed_keys,
+            abort=lambda: not self.active,
+            max_wait=engine.max_key_wait
+        )
+
+    def request_translations(self, texts, batch_num, on_item=None, sizer=None):
+        """Send one translation request; returns a list with None for missing items.
+
+        With on_item the reply is streamed and on_item(index, translation)
+        is called for each real translation as soon as it arrives. The
+        outcome is fed back to `sizer` (an AdaptiveBatchSizer) if given.
+        """
+        gate = self.engine.request_gate
+        if gate is None:
+            return self.dispatch_request(texts, batch_num, on_item, sizer)
+        # Take this job's turn among the jobs sharing the keys
+        if not gate.acquire(self, abort=lambda: not self.active):
+            return [None] * len(texts)
+        try:
+            return self.dispatch_request(texts, batch_num, on_item, sizer)
+        finally:
+            gate.release(self)
+
+    def dispatch_request(self, texts, batch_num, on_item=None, sizer=None):
+        engine = self.engine
+        estimated = engine.backend.estimate_tokens(texts)
+
+        # Wait for the key with the most headroom (rotates API keys)
+        api_index = self.acquire_key(estimated)
+        if api_index is None:
+            return [None] * len(texts)  # Translation stopped while waiting for quota
+        self.on_progress(api_status=f"🔑 Using API Key {api_index + 1}")
+
+        self.log(f"🔄 Processing batch {batch_num} ({len(texts)} cues) with API key {api_index + 1}")
+
+        if self.request_pool is None:
+            return self.send_request(api_index, texts, batch_num, estimated, on_item, sizer)
+        return self.hedged_request(api_index, texts, batch_num, estimated, on_item, sizer)
+
+    def send_request(self, api_index, texts, batch_num, estimated, on_item=None, sizer=None):
+        """Send a batch with one key and record the outcome; returns a list with None for missing items"""
+        engine = self.engine
+        source_chars = sum(len(text) for text in texts)
+
+        def deliver(index, translation):
+            # Items still in English wait for the usual repair instead
+            if not engine.is_untranslated(texts[index], translation):
+                on_item(index, translation)
+
+        request_start = time.time()
+        try:
+            result = engine.backend.translate_batch(
+                api_index, texts, engine.json_mode, metrics=self.metrics,
+                on_item=deliver if on_item is not None else None
+            )
+        except Exception as e:
+            rate_limited = engine.is_rate_limit_error(e)
+            self.metrics.record_request(api_index, time.time() - request_start, 'rate_limited' if rate_limited else 'error')
+            if rate_limited:
+                # Open this key's breaker so the scheduler hands out a different one
+                daily = getattr(e, 'daily', False)
+                engine.key_health.record_quota_error(api_index, getattr(e, 'retry_after', None), daily)
+                if daily:
+                    self.log(f"⛔ API key {api_index + 1} has used up its daily quota, taking it out until the reset")
+                else:
+                    self.log(f"⚠️ Rate limit hit on API key {api_index + 1} (batch {batch_num}), trying next API key...")
+            else:
+                engine.key_health.record_failure(api_index)
+                if sizer is not None:
+                    sizer.observe(source_chars, time.time() - request_start, len(texts), 0)
+            raise
+        latency = time.time() - request_start
+        self.metrics.record_request(api_index, latency, 'success')
+        engine.key_health.record_success(api_index, result.total_tokens)
+        engine.hedge_policy.record(latency)
+
+        if result.total_tokens:
+            engine.scheduler.record_usage(api_index, estimated, result.total_tokens)
+
+        if result.parse_fallback:
+            self.log(f"⚠️ Invalid JSON reply for batch {batch_num}, fell back to marker parsing")
+        if result.stream_error is not None:
+            received = sum(1 for translation in result.translations if translation is not None)
+            self.log(
+                f"📡 Stream for batch {batch_num} broke off after {received} of {len(texts)} cues "
+                f"({result.stream_error}), keeping those"
+            )
+
+        if sizer is not None and result.stream_error is None:
+            # Only items lost from the reply say it was too long; lines left
+            # in English are a repair matter, not a sign of truncation
+            received = sum(1 for translation in result.translations if translation is not None)
+            sizer.observe(source_chars, latency, len(texts), received)
+
+        translations = [
+            None if engine.is_untranslated(text, translation) else translation
+            for text, translation in zip(texts, result.translations)
+        ]
+
+        return translations
+
+    def hedged_request(self, api_index, texts, batch_num, estimated, on_item=None, sizer=None):
+        """Send a batch and, if it straggles, a copy on another key.
+
+        The first answer with any translation in it wins; the other request
+        is left to finish in the background and its answer is ignored.
+        """
+        policy = self.engine.hedge_policy
+        policy.count_request()
+        primary = self.request_pool.submit(self.send_request, api_index, texts, batch_num, estimated, on_item, sizer)
+
+        delay = policy.delay()
+        if delay is None or wait([primary], timeout=delay).done:
+            return primary.result()
+
+        hedge_key = self.acquire_hedge_key(api_index, estimated)
+        if hedge_key is None:
+            return primary.result()
+        self.log(f"🏇 Batch {batch_num} is slower than {delay:.1f}s, hedging on API key {hedge_key + 1}")
+        self.metrics.add('hedged_requests', 1)
+        hedge = self.request_pool.submit(self.send_request, hedge_key, texts, batch_num, estimated, on_item)
+
+        pending = {primary, hedge}
+        fallback = None
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    translations = future.result()
+                except Exception as e:
+                    error = error or e
+                    continue
+                if all(translation is None for translation in translations):
+                    fallback = translations
+                    continue
+                if future is hedge:
+                    self.metrics.add('hedge_wins', 1)
+                    self.log(f"🏁 Hedge on API key {hedge_key + 1} won batch {batch_num}")
+                else:
+                    self.metrics.add('hedge_wasted', 1)
+                return translations
+
+        self.metrics.add('hedge_wasted', 1)
+        if fallback is not None:
+            return fallback
+        raise error
+
+    def acquire_hedge_key(self, api_index, estimated_tokens):
+        """Reserve a different key for a hedge if one is free right now and the budget allows"""
+        engine = self.engine
+        allowed_keys = [key for key in engine.ready_keys if key != api_index] if engine.auto_rotate else []
+        if not allowed_keys or not engine.hedge_policy.try_spend():
+            return None
+        try:
+            hedge_key = engine.scheduler.acquire(
+                estimated_tokens, allowed_keys=allowed_keys, abort=lambda: not self.active, max_wait=0
+            )
+        except NoKeyAvailable:
+            hedge_key = None
+        if hedge_key is None:
+            engine.hedge_policy.refund()
+        return hedge_key
+
+    def attempt_part(self, part):
+        """Send one request for a part of a batch and fold the reply into the batch.
+
+        Sets part.retry_reason when the part needs another attempt; the run
+        loop decides when, so a failing batch never sleeps on a worker.
+        """
+        engine = self.engine
+        batch = part.batch
+        part.retry_reason = None
+
+        todo = part.todo
+
+        def on_item(index, translation):
+            self.streamed.put((batch, todo[index], translation))  # Written out by the run loop
+
+        # Only first attempts at whole batches tell the sizer how big a batch
+        # can be; repairs and splits are smaller than its budget
+        sizer = self.batch_sizer if part.failed_attempts == 0 and len(todo) == len(batch.texts) else None
+        try:
+            results = self.request_translations(
+                [batch.texts[i] for i in todo], batch.batch_num, on_item if engine.streaming else None, sizer
+            )
+        except NoKeyAvailable:
+            raise
+        except Exception as e:
+            if engine.is_rate_limit_error(e):
+                part.rate_limited += 1
+                part.retry_reason = 'rate limited'  # The key is parked; the next attempt goes to another one
+            else:
+                part.failed_attempts += 1
+                part.retry_reason = f"error: {type(e).__name__}"
+                self.log(f"⚠️ Error in batch {batch.batch_num}, attempt {part.failed_attempts}: {str(e)}")
+            return part
+
+        for i, translation in zip(part.todo, results):
+            batch.translations[i] = translation
+        missing = [i for i in part.todo if batch.translations[i] is None]
+        if len(missing) == len(part.todo):
+            part.failed_attempts += 1  # No progress at all
+            part.retry_reason = 'no translations'
+        elif missing:
+            self.log(f"🩹 Re-requesting {len(missing)} missing or untranslated cues from batch {batch.batch_num}")
+            part.retry_reason = 'missing items'
+        part.todo = missing
+        return part
+
+    def settle_part(self, part, retries):
+        """Queue a part for its next attempt; returns True once it needs none.
+
+        Errors back off for retry_delay times the failures so far, and a
+        part that keeps failing (errors or replies without a single
+        translation) is split in half. Missing items and 429s are retried
+        at once: the latter on another key.
+        """
+        engine = self.engine
+        batch = part.batch
+        reason = part.retry_reason
+        if reason is None or not self.active:
+            return True
+        if (part.failed_attempts >= engine.max_retries
+                or part.rate_limited >= engine.max_retries * len(engine.api_keys)):
+            return True
+        # Repairs follow a reply that made progress, so the shrinking todo bounds them
+        if reason not in ('rate limited', 'missing items') and not retries.try_spend():
+            self.log(f"🪫 Retry budget used up, {len(part.todo)} cues of batch {batch.batch_num} keep their English text")
+            return True
+
+        self.metrics.record_retry(batch.batch_num, reason)
+        failing = reason.startswith('error') or reason == 'no translations'
+        if failing and part.failed_attempts >= 2 and len(part.todo) > 1:
+            self.log(f"✂️ Splitting batch {batch.batch_num} ({len(part.todo)} cues) in half")
+            middle = len(part.todo) // 2
+            retries.push(BatchPart(batch, part.todo[middle:]))
+            retries.push(BatchPart(batch, part.todo[:middle]))
+            batch.parts += 1
+        elif reason in ('rate limited', 'missing items'):
+            retries.push(part)
+        else:
+            retries.push(part, engine.retry_delay * part.failed_attempts)
+        return False
+
+    def deliver(self, batch, items, pool, touched):
+        """Write (index, translation) items of a batch into every cue of their unit.
+
+        Items that were already delivered are skipped; a None translation
+        keeps the English text. Only real translations are journaled, so a
+        resume retries the rest.
+        """
+        journal_items = {}
+        for index, translation in items:
+            if batch.delivered[index]:
+                continue
+            batch.delivered[index] = 1
+            # Cues that could not be translated keep their English text
+            text = f"<b>{translation}</b>" if translation is not None else batch.texts[index]
+            # Fan the translation out to every occurrence of the line
+            for i in batch.batch_units[index]:
+                task, position = pool[i]
+                task.subtitles[position].translation = text
+                task.finished[position] = 1
+                task.completed_cues += 1
+                touched.add(task)
+                if translation is not None:
+                    journal_items.setdefault(task, {}).setdefault(text, []).append(position)
+            self.completed_units += 1
+        with self.metrics.stage('journal'):
+            for task, texts in journal_items.items():
+                task.journal.record((positions, text) for text, positions in texts.items())
+
+    def finish_batch(self, batch):
+        """Log the outcome of a batch whose parts are all settled; returns its translations"""
+        failed = sum(1 for translation in batch.translations if translation is None)
+        if failed:
+            self.log(f"❌ {failed} of {len(batch.texts)} cues in batch {batch.batch_num} could not be translated, keeping English text")
+        else:
+            self.log(f"✅ Batch {batch.batch_num} completed successfully")
+
+        self.engine.remember_translations(batch.texts, batch.translations)
+        return batch.translations
+
+    def flush_ready_subtitles(self, task):
+        """Write the contiguous run of finished cues starting at task.output_ready.
+
+        Written cues are released (their slot and their text), so a long
+        file only holds the lines that are not written out yet.
+        """
+        subtitles = task.subtitles
+        finished = task.finished
+        total = len(finished)
+        output_ready = task.output_ready
+        with self.metrics.stage('file_write'):
+            while output_ready < total and finished[output_ready]:
+                cue = subtitles[output_ready]
+                task.writer.write(cue)
+                # The run's list of pending cues may still point at the Cue itself
+                cue.text = cue.translation = None
+                subtitles[output_ready] = None
+                output_ready += 1
+            task.writer.flush()
+        task.output_ready = output_ready
+
+    def export_metrics(self):
+        """Write the run's metrics report next to the output file"""
+        self.metrics.finish()
+        if not self.engine.export_metrics_enabled or not self.metrics_path:
+            return
+        try:
+            paths = self.metrics.export(self.metrics_path)
+            self.log(f"📈 Metrics saved: {', '.join(os.path.basename(path) for path in paths)}")
+        except Exception as e:
+            self.log(f"⚠️ Could not export metrics: {str(e)}")
+
+    def prepare_file(self, task):
+        """Parse a file and restore its journal; leaves the cues still to translate"""
+        with self.metrics.stage('parse'):
+            task.subtitles = self.engine.parse_srt_file(task.input_file)
+        total_subtitles = len(task.subtitles)
+
+        if total_subtitles == 0:
+            self.log(f"❌ No subtitles found in {os.path.basename(task.input_file)}")
+            task.summary = {'status': 'empty', 'cues': 0}
+            return
+
+        self.log(f"📝 Found {total_subtitles} subtitle entries in {os.path.basename(task.input_file)}")
+
+        task.finished = bytearray(total_subtitles)
+
+        # Resume from the journal of an earlier run on the same input file
+        input_hash = hash_file(task.input_file)
+        task.journal = TranslationJournal(task.output_file)
+        restored = task.journal.load(input_hash)
+        for position, text in restored.items():
+            if position < total_subtitles:
+                task.subtitles[position].translation = text
+                task.finished[position] = 1
+        task.journal.open(input_hash, resume=bool(restored))
+        if restored:
+            self.log(f"⏯️ Resuming job: {sum(task.finished)} cues restored from journal")
+
+        if task.previous is not None:
+            self.reuse_previous(task)
+        task.pending_positions = [p for p in range(total_subtitles) if not task.finished[p]]
+
+    def reuse_previous(self, task):
+        """Fill in the cues whose line is unchanged since the previous English/Sinhala pair"""
+        engine = self.engine
+        old_source_file, old_translation_file = task.previous
+        with self.metrics.stage('align'):
+            old_source = engine.parse_srt_file(old_source_file)
+            old_translated = engine.parse_srt_file(old_translation_file)
+            # Lines the old run left in English are sent again
+            pairs = [
+                (source, translated) for source, translated in pair_previous(old_source, old_translated)
+                if not engine.is_untranslated(source.text, translated.text)
+            ]
+            aligned = align_translations(pairs, task.subtitles)
+
+        for position, translation in aligned.items():
+            if not task.finished[position]:
+                task.subtitles[position].translation = translation
+                task.finished[position] = 1
+                task.reused_cues += 1
+        self.log(
+            f"🔁 Reused {task.reused_cues}/{len(task.subtitles)} translations from "
+            f"{os.path.basename(old_translation_file)}"
+        )
+
+    def finish_file(self, task, start_time):
+        """Commit a file whose cues are all written and drop its journal"""
+        self.flush_ready_subtitles(task)
+        with self.metrics.stage('file_write'):
+            task.writer.commit()
+        task.journal.remove()
+        self.log(f"💾 File saved with UTF-8 encoding: {os.path.basename(task.output_file)}")
+
+        total_time = time.time() - start_time
+        cues = len(task.subtitles)
+        task.summary = {
+            'status': 'completed',
+            'cues': cues,
+            'seconds': round(total_time, 3),
+            'cues_per_second': round(cues / total_time, 1) if total_time > 0 else 0,
+            'memory_hits': task.cache_hits,
+            'reused_cues': task.reused_cues,
+        }
+        task.subtitles = task.finished = None  # Free the cues of finished files
+        self.on_file_done(task)
+
+    def run(self):
+        """Translate every file of the job; returns a summary dict.
+
+        Cues of all files form one pool: identical lines are translated once
+        across files and batches are packed across file boundaries. Files
+        are committed in order as soon as all of their cues are finished.
+        With several files, a file that cannot be read fails on its own.
+        """
+        engine = self.engine
+        batch_size = engine.batch_size
+        max_in_flight = engine.max_in_flight
+        self.metrics = RunMetrics(profile=engine.profile_run)
+        self.metrics.start_thread_profile()
+        try:
+            start_time = time.time()
+
+            self.log("🔍 Parsing subtitle file...")
+            self.on_progress(status="Parsing subtitle file...")
+
+            for task in self.files:
+                try:
+                    self.prepare_file(task)
+                except Exception as e:
+                    if len(self.files) == 1:
+                        raise
+                    self.log(f"❌ Could not read {os.path.basename(task.input_file)}: {str(e)}")
+                    task.close()
+                    task.summary = {'status': 'failed', 'error': str(e)}
+            live_tasks = [task for task in self.files if task.summary is None]
+            if not live_tasks:
+                return self.summarize(start_time)
+            total_subtitles = sum(len(task.subtitles) for task in live_tasks)
+
+            # One pool of the cues still to translate, over all files
+            pool = [(task, position) for task in live_tasks for position in task.pending_positions]
+
+            # Fill in cues that are already in the translation memory
+            cache_hits = 0
+            memory = engine.get_translation_memory()
+            if memory is not None and total_subtitles:
+                with self.metrics.stage('memory_lookup'):
+                    cached = memory.lookup_many(task.subtitles[p].text for task, p in pool)
+                still_pending = []
+                for task, position in pool:
+                    cue = task.subtitles[position]
+                    translation = cached.get(normalize_text(cue.text))
+                    if translation is None:
+                        still_pending.append((task, position))
+                    else:
+                        cue.translation = f"<b>{translation}</b>"
+                        task.finished[position] = 1
+                        task.cache_hits += 1
+                cache_hits = len(pool) - len(still_pending)
+                pool = still_pending
+                self.log(
+                    f"🧠 Translation memory: {cache_hits}/{total_subtitles} cues reused "
+                    f"({cache_hits / total_subtitles:.0%} hit ratio)"
+                )
+            for task, position in pool:
+                task.total_cues += 1
+
+            # Collapse identical cues so each distinct line is translated once
+            cues = [task.subtitles[position] for task, position in pool]
+            with self.metrics.stage('dedup'):
+                units = deduplicate_cues(cues, range(len(cues)))
+            duplicate_chars = sum(
+                len(cues[i].text) for unit in units for i in unit[1:]
+            )
+            initial_chars = None
+            saved_calls_estimated = False
+            if engine.adaptive_batching and units:
+                initial_chars = sum(len(cues[unit[0]].text) for unit in units) / len(units) * batch_size
+            if initial_chars is None:
+                saved_calls = math.ceil(len(cues) / batch_size) - math.ceil(len(units) / batch_size)
+            elif len(units) < len(cues):
+                # Adaptive batches are packed by characters as the run goes, so, like
+                # the planner, compare both packings at the starting budget
+                every_cue = [[i] for i in range(len(cues))]
+                saved_calls = (
+                    sum(1 for _ in iter_batches(every_cue, cues, batch_size, AdaptiveBatchSizer(initial_chars)))
+                    - sum(1 for _ in iter_batches(units, cues, batch_size, AdaptiveBatchSizer(initial_chars)))
+                )
+                saved_calls_estimated = True
+            else:
+                saved_calls = 0
+            calls_about = "~" if saved_calls_estimated else ""
+            if len(units) < len(cues):
+                saved = f"{calls_about}{saved_calls} API calls, "
+                self.log(
+                    f"♻️ {len(cues) - len(units)} duplicate cues merged "
+                    f"({saved}{duplicate_chars} prompt characters saved)"
+                )
+
+            # Create batches (only cache misses go to the API)
+            if initial_chars is not None:
+                self.batch_sizer = AdaptiveBatchSizer(initial_chars=initial_chars)
+                self.log(f"📦 Adaptive batching from {self.batch_sizer.budget} characters per batch")
+            else:
+                self.batch_sizer = None
+                self.log(f"📦 Creating {math.ceil(len(units) / batch_size)} batches (batch size: {batch_size})")
+            self.total_units = len(units)
+            self.completed_units = 0
+            self.completed_batches = 0
+            self.log(f"🔑 Using {len(engine.api_keys)} API keys for rotation")
+            for line in engine.key_health.describe():
+                self.log(f"🩺 {line}")
+
+            self.log(f"🚦 Up to {max_in_flight} batches in flight at once")
+            if engine.hedge_requests and engine.auto_rotate and len(engine.ready_keys) > 1:
+                # Requests run on their own threads so a batch can wait on two at once
+                self.request_pool = ThreadPoolExecutor(max_workers=2 * max_in_flight)
+                self.log(f"🏇 Hedging batches slower than p{engine.hedge_policy.percentile:g} on a second key")
+
+            # Results land in their original slots and each file's contiguous
+            # finished prefix is written out at once
+            for task in live_tasks:
+                task.writer = IncrementalSrtWriter(task.output_file)
+                self.flush_ready_subtitles(task)
+                self.log(f"📝 Partial output: {os.path.basename(task.writer.part_path)}")
+            in_flight = {}
+            retries = RetryQueue(engine.retry_budget)
+            pending_batches = enumerate(iter_batches(units, cues, batch_size, self.batch_sizer), 1)
+            next_file = 0  # Files are committed in order
+
+            with ThreadPoolExecutor(max_workers=max_in_flight, initializer=self.metrics.start_thread_profile) as executor:
+                while self.active:
+                    # Commit every leading file whose cues are all in
+                    while next_file < len(live_tasks) and live_tasks[next_file].completed_cues == live_tasks[next_file].total_cues:
+                        self.finish_file(live_tasks[next_file], start_time)
+                        next_file += 1
+
+                    # Keep the pool topped up to the in-flight limit, retries that are due first
+                    while len(in_flight) < max_in_flight:
+                        part = retries.pop_due()
+                        if part is None:
+                            try:
+                                # Batches are packed lazily, so this is where batching runs
+                                with self.metrics.stage('batching'):
+                                    batch_num, batch_units = next(pending_batches)
+                            except StopIteration:
+                                break
+                            batch = PendingBatch(batch_num, batch_units, [cues[unit[0]].text for unit in batch_units])
+                            self.metrics.record_batch(batch_num)
+                            retries.count_batch()
+                            part = BatchPart(batch, list(range(len(batch_units))))
+                        in_flight[executor.submit(self.attempt_part, part)] = part
+
+                    if not in_flight:
+                        if not retries:
+                            break
+                        # Only retries are left: wait for the next deadline
+                        time.sleep(min(1.0, retries.time_to_next()))
+                        continue
+
+                    # Wake up for the next retry deadline if there is room to send it,
+                    # and regularly to write out streamed cues
+                    timeout = retries.time_to_next() if len(in_flight) < max_in_flight else None
+                    if engine.streaming:
+                        timeout = STREAM_POLL_INTERVAL if timeout is None else min(timeout, STREAM_POLL_INTERVAL)
+                    done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+                    touched = set()
+                    for future in done:
+                        part = in_flight.pop(future)
+                        future.result()
+                        batch = part.batch
+                        if not self.settle_part(part, retries):
+                            continue
+                        batch.parts -= 1
+                        if batch.parts:
+                            continue
+                        translations = self.finish_batch(batch)
+                        self.deliver(batch, enumerate(translations), pool, touched)
+                        self.completed_batches += 1
+
+                    # Cues released early by streamed replies, one delivery (and
+                    # one journal record) per batch for everything since the last poll
+                    streamed = {}
+                    while not self.streamed.empty():
+                        batch, index, translation = self.streamed.get()
+                        streamed.setdefault(batch, []).append((index, translation))
+                    for batch, items in streamed.items():
+                        self.deliver(batch, items, pool, touched)
+
+                    for task in touched:
+                        self.flush_ready_subtitles(task)
+
+                    # Calculate speed
+                    elapsed_time = time.time() - start_time
+                    subtitles_per_sec = self.completed_units / elapsed_time if elapsed_time > 0 else 0
+                    self.on_progress(
+                        status=f"Processed {self.completed_units}/{self.total_units} lines in {self.completed_batches} batches ({len(in_flight)} in flight)",
+                        progress=(self.completed_units / self.total_units) * 100,
+                        speed=f"⚡ {subtitles_per_sec:.1f} subtitles/sec"
+                    )
+
+            if self.active:
+                self.log("💾 Saving translated subtitles...")
+                self.on_progress(status="Saving file...")
+                for task in live_tasks[next_file:]:
+                    self.finish_file(task, start_time)
+            for task in live_tasks:
+                if task.summary is None:
+                    task.summary = {'status': 'stopped', 'cues': len(task.subtitles)}
+
+            summary = self.summarize(start_time)
+            summary['duplicate_cues'] = len(cues) - len(units)
+            summary['saved_calls'] = saved_calls
+            # True when the saving comes from packing at the adaptive starting budget
+            summary['saved_calls_estimated'] = saved_calls_estimated
+            retry_reasons = self.metrics.retry_reason_counts()
+            summary['retries'] = sum(retry_reasons.values())
+            summary['retry_reasons'] = retry_reasons
+            summary['prompt_tokens'] = self.metrics.counters.get('prompt_tokens', 0)
+            # True when some request's backend did not report its usage
+            summary['prompt_tokens_estimated'] = bool(self.metrics.counters.get('estimated_prompt_requests'))
+            if self.request_pool is not None:
+                counters = self.metrics.counters
+                summary['hedges'] = counters.get('hedged_requests', 0)
+                summary['hedge_wins'] = counters.get('hedge_wins', 0)
+                summary['hedge_wasted'] = counters.get('hedge_wasted', 0)
+            if summary['status'] != 'completed':
+                return summary
+
+            self.log("🎉 Translation completed successfully!")
+            self.log(f"📊 Processed {summary['cues']} subtitles in {summary['seconds']:.1f} seconds")
+            self.log(f"⚡ Average speed: {summary['cues_per_second']:.1f} subtitles/second")
+            if memory is not None:
+                self.log(f"🧠 Translation memory hit ratio: {cache_hits / total_subtitles:.0%} ({cache_hits} cues)")
+            self.log(
+                f"♻️ Deduplication saved {calls_about}{saved_calls} API calls and {duplicate_chars} prompt characters"
+            )
+            if self.completed_batches:
+                about = "~" if summary['prompt_tokens_estimated'] else ""
+                self.log(
+                    f"🧾 Prompt tokens: {about}{summary['prompt_tokens']} "
+                    f"({about}{summary['prompt_tokens'] / self.completed_batches:.0f} per batch)"
+                )
+            if retry_reasons:
+                reasons = ", ".join(f"{reason}: {count}" for reason, count in sorted(retry_reasons.items()))
+                self.log(
+                    f"🔁 {summary['retries']} retries over {len(self.metrics.retry_reasons)} batches ({reasons})"
+                )
+            if 'hedges' in summary:
+                self.log(
+                    f"🏁 Hedging: {summary['hedges']} hedged, {summary['hedge_wins']} won, "
+                    f"{summary['hedge_wasted']} wasted"
+                )
+            for task in live_tasks:
+                self.log(f"💾 Saved to: {task.output_file}")
+
+            self.on_progress(
+                progress=100,
+                status="Translation completed successfully!",
+                speed=f"⚡ Final: {summary['cues_per_second']:.1f} subtitles/sec"
+            )
+            return summary
+
+        finally:
+            self.active = False
+            if self.request_pool is not None:
+                self.request_pool.shutdown(wait=False, cancel_futures=True)
+            for task in self.files:
+                task.close()
+            self.export_metrics()
+            engine.save_key_health()
+
+    def summarize(self, start_time):
+        """Overall summary of the job from the summaries of its files"""
+        statuses = [task.summary['status'] for task in self.files]
+        if len(statuses) == 1:
+            status = statuses[0]
+        elif 'stopped' in statuses:
+            status = 'stopped'
+        else:
+            status = 'completed' if all(s == 'completed' for s in statuses) else 'failed'
+
+        total_time = time.time() - start_time
+        cues = sum(task.summary.get('cues', 0) for task in self.files)
+        return {
+            'status': status,
+            'cues': cues,
+            'seconds': round(total_time, 3),
+            'cues_per_second': round(cues / total_time, 1) if total_time > 0 else 0,
+            'memory_hits': sum(task.cache_hits for task in self.files),
+            'reused_cues': sum(task.reused_cues for task in self.files),
+            'batches': self.completed_batches,
+        }
+
+
+class PooledTranslationJob(TranslationJob):
+    """Translates a set of files as one pool of cues.
+
+    Batches are packed across file boundaries and lines repeated between
+    files (openings, recaps) are translated once, so a season costs fewer
+    requests than translating its episodes one by one. `on_file_done` is
+    called with each FileTask as its output is committed; run() adds a
+    'files' list with one summary per input.
+    """
+
+    def __init__(self, engine, file_pairs, log=None, on_progress=None, on_file_done=None, metrics_path=None):
+        super().__init__(engine, *file_pairs[0], log=log, on_progress=on_progress)
+        self.files = [FileTask(input_file, output_file) for input_file, output_file in file_pairs]
+        self.metrics_path = metrics_path or self.files[0].output_file
+        self.on_file_done = on_file_done or ignore
+
+    def summarize(self, start_time):
+        summary = super().summarize(start_time)
+        summary['files'] = [
+            {'input': task.input_file, 'output': task.output_file, **task.summary}
+            for task in self.files
+        ]
+        return summary